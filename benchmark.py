@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+import numpy as np
+import scipy
+from gol import ALIVE, DEAD, SPORE, GameOfLife, SporeLife, fused_step_kernel
+from birth_rate import births_time_series
+from lifetime_distribution import lifetime_distribution
+from transitions import count_transitions
+from util import random_init_grid
+
+
+class Int64SporeLife(SporeLife):
+    """
+    SporeLife with the grid and neighbor count dtypes used before the compact
+    uint8 dtype policy, for comparison.
+    """
+    grid_dtype = np.int64
+    count_dtype = np.intc
+
+
+def time_steps(ca, steps: int, **kwargs) -> float:
+    """
+    Average wall time of a step of the CellularAutomaton ca.
+    """
+    t0 = perf_counter()
+    for _ in range(steps):
+        ca.step(**kwargs)
+    return (perf_counter() - t0) / steps
+
+
+def peak_step_memory(ca, **kwargs) -> int:
+    """
+    Peak memory in bytes allocated during a single step of ca.
+    """
+    tracemalloc.start()
+    ca.step(**kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def dtype_benchmark(sizes=(100, 300, 1000), steps: int = 50,
+                    alpha: float = 0.5) -> list[dict]:
+    """
+    Compare memory and step time of SporeLife with int64 grids and the compact
+    uint8 grids for each grid size in sizes.
+    """
+    results = []
+    for N in sizes:
+        init_grid = random_init_grid(N, seed=1)
+        for cls in (Int64SporeLife, SporeLife):
+            sl = cls(init_grid, alpha=alpha, seed=1)
+            results.append({
+                "N": N,
+                "dtype": np.dtype(cls.grid_dtype).name,
+                "grid_bytes": sl.grid.nbytes + sl.life_neighborhood_grid.nbytes,
+                "step_peak_bytes": peak_step_memory(sl),
+                "step_time": time_steps(sl, steps),
+            })
+    return results
+
+
+def legacy_count_transitions(sl: SporeLife) -> np.ndarray:
+    """
+    Rule table counts as computed by transitions.count_transitions before, by
+    27 full grid mask and sum passes.
+    """
+    counts = np.zeros((3, 9))
+    c = sl.life_neighborhood_grid
+    counts[DEAD] = [np.sum((sl.grid == DEAD) & (c == n)) for n in range(9)]
+    counts[ALIVE] = [np.sum((sl.grid == ALIVE) & (c == n)) for n in range(9)]
+    counts[SPORE] = [np.sum((sl.grid == SPORE) & (c == n)) for n in range(9)]
+    return counts
+
+
+def transitions_benchmark(N: int = 300, repeats: int = 50,
+                          alpha: float = 0.5) -> list[dict]:
+    """
+    Compare the time of a rule table count with the legacy mask and sum
+    implementation and the bincount implementation on an N x N SporeLife.
+    """
+    sl = SporeLife(random_init_grid(N, seed=1), alpha=alpha, seed=1)
+    sl.step_until(20)
+    results = []
+    for name, count in (("legacy", legacy_count_transitions),
+                        ("bincount", count_transitions)):
+        t0 = perf_counter()
+        for _ in range(repeats):
+            count(sl)
+        results.append({
+            "N": N,
+            "implementation": name,
+            "count_time": (perf_counter() - t0) / repeats,
+        })
+    return results
+
+
+# Step benchmarks of the suite as (class, method, step kwargs)
+STEP_CASES = [
+    (GameOfLife, "step", {}),
+    (GameOfLife, "step", {"scramble": True}),
+    (GameOfLife, "step", {"overcrowd_birth_p": 0.5}),
+] + [
+    (SporeLife, method, kwargs)
+    for method in ("step", "deterministic_step")
+    for kwargs in ({}, {"overcrowd_dormancy": True}, {"scramble": True},
+                   {"overcrowd_birth_p": 0.5})
+]
+
+# Measurement helpers of the suite, run for the given number of steps
+HELPER_CASES = {
+    "lifetime_distribution":
+        lambda sl, steps: lifetime_distribution(ALIVE, sl, sl.t + steps, sl.t),
+    "births_time_series":
+        lambda sl, steps: births_time_series(sl, sl.t + steps, sl.t),
+    "count_transitions":
+        lambda sl, steps: [count_transitions(sl) for _ in range(steps)],
+}
+
+
+def available_engines() -> list[str]:
+    engines = ["mask", "table"]
+    if fused_step_kernel() is not None:
+        engines.append("numba")
+    return engines
+
+
+def _options(kwargs: dict) -> str:
+    return ",".join(f"{key}={value}" for key, value in kwargs.items()) or "-"
+
+
+def _measure(run, steps: int) -> tuple[float, int]:
+    """
+    Wall time per step of run(steps) and the peak memory of run(1), which is
+    measured separately since tracemalloc slows down the run.
+    """
+    run(1) # warm up, e.g. compile the numba kernel
+    t0 = perf_counter()
+    run(steps)
+    time_per_step = (perf_counter() - t0) / steps
+    tracemalloc.start()
+    run(1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return time_per_step, peak
+
+
+def run_suite(sizes=(20, 64, 256, 1024, 4096), alphas=(0.5, 1),
+              engines: list[str] = None, cell_budget: float = 2e7,
+              progress_updates: bool = False) -> list[dict]:
+    """
+    Measure the cell updates per second and the peak memory of a step of all
+    STEP_CASES and HELPER_CASES on random N x N grids for each N in sizes, on
+    all engines and, where it matters, all alphas. Each measurement runs
+    cell_budget / N**2 steps, at least 3 and at most 200.
+    """
+    engines = engines or available_engines()
+    results = []
+    for N in sizes:
+        steps = int(min(max(cell_budget // N**2, 3), 200))
+        init_grid = random_init_grid(N, seed=1)
+        cases = [(f"{cls.__name__}.{method}", kwargs, engine, alpha,
+                  cls, method)
+                 for cls, method, kwargs in STEP_CASES
+                 for engine in engines
+                 # alpha only matters for stochastic SporeLife steps
+                 for alpha in (alphas if (cls, method) == (SporeLife, "step")
+                               else (None,))]
+        cases += [(name, {}, "table", alpha, SporeLife, helper)
+                  for name, helper in HELPER_CASES.items()
+                  for alpha in alphas]
+        for name, kwargs, engine, alpha, cls, method in cases:
+            if progress_updates:
+                sys.stdout.write(f"\r{N} {name} {engine} {alpha}".ljust(60))
+                sys.stdout.flush()
+            ca_kwargs = {} if alpha is None else {"alpha": alpha}
+            ca = cls(init_grid % 2 if cls is GameOfLife else init_grid,
+                     seed=1, engine=engine, **ca_kwargs)
+            if callable(method):
+                run = lambda n: method(ca, n)
+            else:
+                step = getattr(ca, method)
+                run = lambda n: [step(**kwargs) for _ in range(n)]
+            time_per_step, peak = _measure(run, steps)
+            results.append({
+                "benchmark": name,
+                "options": _options(kwargs),
+                "N": N,
+                "alpha": alpha,
+                "engine": engine,
+                "steps": steps,
+                "time_per_step": time_per_step,
+                "cell_updates_per_s": N**2 / time_per_step,
+                "peak_bytes": peak,
+            })
+    if progress_updates:
+        print()
+    return results
+
+
+def machine_info() -> dict:
+    """
+    Commit and machine the suite runs on, to tell results apart.
+    """
+    def git(*args):
+        try:
+            return subprocess.run(
+                ["git", *args], capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": None if status is None else bool(status),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+    }
+
+
+def save_suite(results: list[dict], path: str):
+    with open(path, "w") as f:
+        json.dump({"machine": machine_info(), "results": results}, f,
+                  indent=1)
+
+
+def load_suite(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_suites(old: dict, new: dict, tolerance: float = 0.1) -> list[dict]:
+    """
+    Throughput ratios new / old of the benchmarks contained in both suites,
+    as loaded by load_suite. Ratios below 1 - tolerance are flagged as
+    regressions.
+    """
+    key = lambda r: (r["benchmark"], r["options"], r["N"], r["alpha"],
+                     r["engine"])
+    old_results = {key(r): r for r in old["results"]}
+    comparison = []
+    for r in new["results"]:
+        if key(r) not in old_results:
+            continue
+        ratio = (r["cell_updates_per_s"]
+                 / old_results[key(r)]["cell_updates_per_s"])
+        comparison.append({
+            "benchmark": r["benchmark"],
+            "options": r["options"],
+            "N": r["N"],
+            "alpha": str(r["alpha"]),
+            "engine": r["engine"],
+            "ratio": ratio,
+            "regression": ratio < 1 - tolerance,
+        })
+    return comparison
+
+
+def print_table(results: list[dict]):
+    keys = list(results[0].keys())
+    rows = [[f"{result[key]:.4g}" if isinstance(result[key], float)
+             else str(result[key]) for key in keys] for result in results]
+    widths = [max(16, len(key), *(len(row[i]) for row in rows))
+              for i, key in enumerate(keys)]
+    print(" ".join(f"{key:>{width}}" for key, width in zip(keys, widths)))
+    for row in rows:
+        print(" ".join(f"{cell:>{width}}" for cell, width in zip(row, widths)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Without options, compare dtypes and transition counts.")
+    parser.add_argument("sizes", type=int, nargs="*")
+    parser.add_argument("--suite", metavar="OUTPUT",
+                        help="run the step throughput suite and store its "
+                             "results as JSON in OUTPUT")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare the throughput of two suite results")
+    args = parser.parse_args()
+    if args.compare:
+        comparison = compare_suites(*map(load_suite, args.compare))
+        if not comparison:
+            sys.exit(f"{args.compare[0]} and {args.compare[1]} share no "
+                     "benchmarks (sizes, engines and options) to compare")
+        print_table(comparison)
+        sys.exit(any(c["regression"] for c in comparison))
+    elif args.suite:
+        results = run_suite(args.sizes or (20, 64, 256, 1024, 4096),
+                            progress_updates=True)
+        save_suite(results, args.suite)
+        print_table(results)
+    else:
+        print_table(dtype_benchmark(args.sizes or [100, 300, 1000]))
+        print_table(transitions_benchmark())
@@ -1,26 +1,47 @@
 import sys, os
 import numpy as np
-import multiprocessing
 from gol import SporeLife
-from util import random_init_grid, save_data
+from sweep import Checkpoint, Sweep
+from util import random_init_grid, run_seeds, save_results
 
 
 BASE_PATH = "./data/spore-life/extinction-time"
 PARAMS = (grid_size, q, t_max, runs, equal_step_limit) = (
           30, 0.3701, 1_000_000, 3, 100)
+METADATA = dict(grid_size=grid_size, q=q, t_max=t_max, runs=runs,
+                equal_step_limit=equal_step_limit)
 ALPHAS = np.linspace(0, 0.5, 30)
 
+# Time the phases of the steps with --profile, printed per alpha at the end
+PROFILE = "--profile" in sys.argv
+
 
 def find_extinction_time(sl: SporeLife, t_max: int,
-                         equal_step_limit: int = 100) -> int:
+                         equal_step_limit: int = 100,
+                         max_period: int = 1000,
+                         checkpoint: Checkpoint = None,
+                         checkpoint_interval: int = 10_000) -> int:
     """
     Find the time step where the DormantLife dl goes extinct, where extinction
     is characterized by the number of alive cells staying constant for at least
     equal_step_limit steps. If sl goes extinct after t_max, -1 is returned.
+    For deterministic sl, extinction is the exact entry into a fixed point or a
+    cycle with period up to max_period, whose period is left in sl.period,
+    and sl is left where its grid first repeats, see
+    CellularAutomaton.find_cycle.
+    If a checkpoint is given, the stochastic search is resumed from it and
+    saved to it every checkpoint_interval steps.
     """
     assert 0 < equal_step_limit < t_max
     assert sl.t == 0
+    if sl.is_deterministic():
+        t_entry, _ = sl.find_cycle(t_max, max_period)
+        return t_entry
     equal_step_counter = 0
+    if checkpoint is not None:
+        extra = checkpoint.restore(sl)
+        if extra is not None:
+            equal_step_counter = extra["equal_step_counter"]
     while sl.t <= t_max:
         if equal_step_counter >= equal_step_limit:
             return sl.t - equal_step_limit
@@ -30,41 +51,80 @@ def find_extinction_time(sl: SporeLife, t_max: int,
             equal_step_counter += 1
         else:
             equal_step_counter = 0
+        # Only after stepping, so that a resumed search does not rewrite the
+        # checkpoint it was restored from
+        if checkpoint is not None and sl.t % checkpoint_interval == 0:
+            checkpoint.save(sl, equal_step_counter=equal_step_counter)
     return -1
 
 
 def extinction_time_stastistics(alpha, grid_size, q, t_max, runs, equal_step_limit,
-                                progress_updates: bool = False) -> np.array:
+                                progress_updates: bool = False,
+                                seed: int = None) -> np.array:
     """
     Find extinction times for SporeLife with grid_size x grid_size and
     inital probability for ALIVE cells q. Returns runs realizations as
-    data array.
+    data array, together with the periods of the final cycles (1 for fixed
+    points, 0 if unknown, i.e. for stochastic dynamics or no extinction).
+    The runs are seeded from seed as in a sweep, see util.run_seeds.
     """
-    data = np.zeros(runs)
+    data, periods = np.zeros(runs), np.zeros(runs)
     for i in range(runs):
         if progress_updates:
             sys.stdout.write(f"\r{round(i/runs * 100, 1)}%")
             sys.stdout.flush()
-        sl = SporeLife(random_init_grid(grid_size, q), alpha=alpha)
+        grid_seed, step_seed = run_seeds(seed, alpha, i)
+        sl = SporeLife(random_init_grid(grid_size, q, grid_seed), alpha=alpha,
+                       seed=step_seed, incremental=True,
+                       sampling="sparse")
         data[i] = find_extinction_time(sl, t_max, equal_step_limit)
-    return data
+        periods[i] = sl.period or 0
+    return data, periods
+
+
+def _unit(alpha, runs, seeds, checkpoint, profiler=None):
+    """
+    Extinction times and periods of the final cycles, see
+    extinction_time_stastistics, for a single run.
+    """
+    assert len(runs) == 1 # the checkpoint holds a single run
+    [(grid_seed, step_seed)] = seeds
+    sl = SporeLife(random_init_grid(grid_size, q, grid_seed), alpha=alpha,
+                   seed=step_seed, incremental=True, sampling="sparse")
+    sl.profiler = profiler
+    t_extinction = find_extinction_time(sl, t_max, equal_step_limit,
+                                        checkpoint=checkpoint)
+    return np.array([[t_extinction, sl.period or 0]])
 
 
-def _f(alpha):
-    print(f"\nalpha = {alpha}")
+def _expected_cost(alpha, runs):
+    """
+    Rough relative run time of a unit for scheduling the longest first:
+    extinction times grow by orders of magnitude towards alpha = 0.5.
+    """
+    return len(runs) * np.exp(20 * alpha)
+
+
+def _save(alpha, results):
     header = f"extinction_time.py -- Extinction times for spore life -- alpha = {alpha}, (grid_size, q, t_max, runs, equal_step_limit) = {str(PARAMS)}"
-    data = extinction_time_stastistics(alpha, *PARAMS, progress_updates=True)
-    save_data(data, param=alpha, header=header, base_path=BASE_PATH, prefix="alpha-")
+    period_header = f"extinction_time.py -- Periods of the final cycles for spore life (1: fixed point, 0: unknown) -- alpha = {alpha}, (grid_size, q, t_max, runs, equal_step_limit) = {str(PARAMS)}"
+    data, periods = results[:, 0], results[:, 1]
+    save_results(data, param=alpha, header=header, base_path=BASE_PATH,
+                 prefix="alpha-", metadata={"alpha": alpha, **METADATA},
+                 overwrite="overwrite")
+    save_results(periods, param=alpha, header=period_header, base_path=BASE_PATH,
+                 prefix="alpha-", sub_path="period",
+                 metadata={"alpha": alpha, **METADATA}, overwrite="overwrite")
 
 
 if __name__ == "__main__":
-    save_data(ALPHAS, prefix="alpha-range", header="extinction_time.py -- Extinction times for spore life -- Alpha values for which data is stored",
-              base_path=BASE_PATH)
-
-    # Use the with statement to create and close the pool
-    with multiprocessing.Pool(processes=5) as pool:
-        # Use imap_unordered to apply the function to each value of alpha in parallel
-        # and yield the results as they are ready, regardless of the order
-        for _ in pool.imap_unordered(_f, ALPHAS):
-            pass
+    save_results(ALPHAS, prefix="alpha-range", header="extinction_time.py -- Extinction times for spore life -- Alpha values for which data is stored",
+                 base_path=BASE_PATH, metadata=METADATA, overwrite="overwrite")
 
+    # Every run is a unit of the sweep, finished runs are kept and unfinished
+    # ones resume from their checkpoints when the sweep is restarted
+    sweep = Sweep(BASE_PATH, ALPHAS, runs)
+    sweep.run(_unit, merge=lambda alpha: _save(alpha, sweep.results(alpha)),
+              cost=_expected_cost, profile=PROFILE)
+    if PROFILE:
+        sweep.print_profiles()
@@ -1,3 +1,9 @@
+import copy
+import hashlib
+import warnings
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from scipy.ndimage import convolve
 
@@ -6,18 +12,249 @@ DEAD = 0
 ALIVE = 1
 SPORE = 2
 
+# Available engines to apply the rules in a step: "mask" applies the rules by
+# boolean masking, "table" by a single gather from a precomputed lookup table,
+# "numba" by a compiled loop over the cells, see fused_step.
+ENGINES = ("mask", "table", "numba")
+
+# Available ways to draw the random decisions of a step: "full" draws a uniform
+# random number for every cell, reproducing the random streams of earlier
+# versions, "sparse" only draws for the cells a decision applies to, see
+# random_subset. Both are equal in distribution.
+SAMPLINGS = ("full", "sparse")
+
+# Phases of a step timed by the profiler of an automaton, see
+# CellularAutomaton.phase: counting the ALIVE neighbors, drawing the birth
+# decisions, applying the rules, killing SPOREs, scrambling, the compiled step
+# of the numba engine (all of these at once), striped steps (all of these in
+# parallel), finding the active region and counting the transitions for the
+# observers, and the observers themselves.
+PHASES = ("neighbors", "births", "rule", "decay", "scramble", "fused",
+          "stripes", "bookkeeping", "observers")
+
+# Context of the phases of automata without profiler
+_NO_PHASE = nullcontext()
+
+
+def game_of_life_rule(grid: np.ndarray, c: np.ndarray,
+                      birth: np.ndarray = None) -> np.ndarray:
+    """
+    Apply the rules of Game of Life to grid, where c holds the number of ALIVE
+    neighbors of each cell, and return the new grid. If given, birth is a
+    boolean mask of cells that are born when they have 4 ALIVE neighbors.
+    """
+    ngrid = grid.copy()
+    ngrid[(grid == ALIVE) & ((c < 2) | (c > 3))] = DEAD
+    # Birth with 4 ALIVE neighbors
+    if birth is not None:
+        ngrid[(grid == DEAD) & (c == 4) & birth] = ALIVE
+    ngrid[(grid == DEAD) & (c == 3)] = ALIVE
+    return ngrid
+
+
+def spore_life_rule(grid: np.ndarray, c: np.ndarray,
+                    overcrowd_dormancy: bool = False,
+                    birth: np.ndarray = None) -> np.ndarray:
+    """
+    Apply the deterministic rules of SporeLife to grid, where c holds the number
+    of ALIVE neighbors of each cell, and return the new grid. If given, birth is
+    a boolean mask of cells that are born when they have 4 ALIVE neighbors.
+    If overcrowd_dormancy is true, an ALIVE cell with 4 ALIVE neighbors goes
+    dormant, else it just dies.
+    """
+    ngrid = grid.copy()
+    # DEAD awake
+    ngrid[(grid == DEAD)
+          & (c == 3)] = ALIVE
+    # DORMANT awake
+    ngrid[(grid == SPORE)
+          & ((c == 2) | (c == 3))] = ALIVE
+    # Birth with 4 ALIVE neighbors
+    if birth is not None:
+        ngrid[((grid == DEAD) | (grid == SPORE)) & (c == 4) & birth] = ALIVE
+    if overcrowd_dormancy:
+        overcrowd_lim = 4
+    else:
+        overcrowd_lim = 3
+    # ALIVE dies
+    ngrid[(grid == ALIVE)
+          & ((c < 1) | (c > overcrowd_lim))] = DEAD
+    # ALIVE goes DORMANT
+    if overcrowd_dormancy:
+        ngrid[(grid == ALIVE)
+              & ((c == 1) | (c == 4))] = SPORE
+    else:
+        ngrid[(grid == ALIVE)
+              & (c == 1)] = SPORE
+    return ngrid
+
+
+def _rule_table(rule, **flags) -> np.ndarray:
+    """
+    Tabulate rule for all combinations of birth decision, cell state and number
+    of ALIVE neighbors. The returned table has shape (2, 3, 9) and is indexed by
+    [birth, state, c].
+    """
+    birth, states, c = np.meshgrid([False, True], [DEAD, ALIVE, SPORE],
+                                   np.arange(9), indexing="ij")
+    return rule(states, c, birth=birth, **flags)
+
+
+# Lookup tables for the rules, GAME_OF_LIFE_TABLE is indexed by
+# [birth, state, c] and SPORE_LIFE_TABLE by [overcrowd_dormancy, birth, state, c]
+GAME_OF_LIFE_TABLE = _rule_table(game_of_life_rule)
+SPORE_LIFE_TABLE = np.array([
+    _rule_table(spore_life_rule, overcrowd_dormancy=False),
+    _rule_table(spore_life_rule, overcrowd_dormancy=True),
+])
+
+
+def table_step(table: np.ndarray, grid: np.ndarray, c: np.ndarray,
+               birth: np.ndarray = None, out: np.ndarray = None,
+               idx: np.ndarray = None) -> np.ndarray:
+    """
+    Compute the new grid in one gather from a rule table indexed by
+    [birth, state, c], as returned by _rule_table. The state and ALIVE neighbor
+    count c of each cell (and optionally the birth decision) are combined into
+    a single index into the flattened table.
+    If out and an np.intp array idx are given, the index is computed in idx
+    and the new grid is written to out without allocating grid sized arrays.
+    """
+    if out is None:
+        idx = grid * 9 # at most 3 * 2 * 9 entries, fits into the uint8 grid dtype
+        idx += c
+        if birth is not None:
+            idx += birth.astype(idx.dtype) * 27
+        return table.astype(grid.dtype).take(idx)
+    # Compute the index in out, which is faster in uint8, and cast it to idx
+    # as take would otherwise allocate an np.intp copy
+    np.multiply(grid, 9, out=out)
+    out += c
+    if birth is not None:
+        np.add(out, 27, out=out, where=birth)
+    np.copyto(idx, out)
+    # The default mode="raise" would buffer out
+    return table.astype(grid.dtype).take(idx, out=out, mode="clip")
+
+
+def transition_counts(old_grid: np.ndarray,
+                      new_grid: np.ndarray) -> np.ndarray:
+    """
+    Number of cells going from each state to each state between old_grid and
+    new_grid, as a (3, 3) array indexed by [from_state, to_state].
+    """
+    idx = old_grid * 3 # at most 3 * 3 entries, fits into the uint8 grid dtype
+    idx += new_grid
+    return np.bincount(idx.ravel(), minlength=9).reshape(3, 3)
+
+
+def random_subset(rng: np.random.Generator, candidates: np.ndarray,
+                  p: float) -> np.ndarray:
+    """
+    Subset of the array candidates, each selected independently with
+    probability p. Instead of a random number per candidate, the size of the
+    subset is drawn from a binomial distribution and then which candidates
+    are selected, so no random numbers are drawn if p is 0 or 1 or there are
+    no candidates.
+    """
+    if p <= 0 or candidates.size == 0:
+        return candidates[:0]
+    if p >= 1:
+        return candidates
+    k = rng.binomial(candidates.size, p)
+    return rng.choice(candidates, size=k, replace=False)
+
+
+def fused_step(grid: np.ndarray, table: np.ndarray, periodic_boundary: bool,
+               death_p: float, birth_p: float, rng: np.random.Generator,
+               out: np.ndarray, counts: np.ndarray):
+    """
+    Single loop over the cells of grid that counts the ALIVE neighbors of each
+    cell, applies the rule table indexed by [birth, state, c], kills new SPOREs
+    with probability death_p and counts the cells of each state of the new grid
+    in counts. Cells with 4 ALIVE neighbors that are not ALIVE are born with
+    probability birth_p. Random numbers are only drawn for these cells and for
+    SPOREs. The new grid is written to out.
+    Compiled by numba for the "numba" engine, see fused_step_kernel.
+    """
+    N = grid.shape[0]
+    counts[:] = 0
+    for i in range(N):
+        for j in range(N):
+            c = 0
+            for di in range(-1, 2):
+                for dj in range(-1, 2):
+                    if di == 0 and dj == 0:
+                        continue
+                    ii, jj = i + di, j + dj
+                    if periodic_boundary:
+                        ii, jj = ii % N, jj % N
+                    elif ii < 0 or ii >= N or jj < 0 or jj >= N:
+                        continue
+                    if grid[ii, jj] == ALIVE:
+                        c += 1
+            state = grid[i, j]
+            birth = 0
+            if birth_p > 0 and c == 4 and state != ALIVE:
+                birth = 1 if rng.random() < birth_p else 0
+            new_state = table[birth, state, c]
+            if new_state == SPORE and death_p > 0 and rng.random() < death_p:
+                new_state = DEAD
+            out[i, j] = new_state
+            counts[new_state] += 1
+
+
+# fused_step compiled on first use, None if numba is not installed
+_FUSED_STEP_KERNEL = []
+
+
+def fused_step_kernel():
+    """
+    fused_step compiled by numba, which is imported on first use, or None if
+    numba is not available.
+    """
+    if not _FUSED_STEP_KERNEL:
+        try:
+            import numba
+        except ImportError:
+            _FUSED_STEP_KERNEL.append(None)
+        else:
+            _FUSED_STEP_KERNEL.append(
+                numba.njit(cache=True, nogil=True)(fused_step))
+    return _FUSED_STEP_KERNEL[0]
+
+
+def _bounding_box(mask: np.ndarray) -> tuple[int]:
+    """
+    Bounding box (row_min, row_max, col_min, col_max) of the True cells in
+    mask, with exclusive maxima, or (0, 0, 0, 0) if there are none.
+    """
+    rows = np.flatnonzero(np.any(mask, axis=1))
+    if rows.size == 0:
+        return 0, 0, 0, 0
+    cols = np.flatnonzero(np.any(mask, axis=0))
+    return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+
 
 class CellularAutomaton():
     """
     Base class for game of life models.
+    Grids are stored as grid_dtype and ALIVE neighbor counts as count_dtype,
+    which are small enough for the three states and at most 8 neighbors.
     """
+    grid_dtype = np.uint8
+    count_dtype = np.uint8
+
     def __init__(self, init_grid: np.ndarray, states: np.array, seed: int,
-                 periodic_boundary: bool):
+                 periodic_boundary: bool, engine: str = "mask",
+                 incremental: bool = False, active_region: bool = False,
+                 threads: int = 1, sampling: str = "full",
+                 buffered: bool = False):
         # Ensure that init_grid is quadratic and only filled with states
         assert (len(init_grid.shape) == 2
                 and init_grid.shape[0] == init_grid.shape[1])
         assert np.all(np.isin(init_grid, states))
-        self.grid = init_grid
+        self.grid = np.array(init_grid, dtype=self.grid_dtype)
         self.t = 0
         self.N = init_grid.shape[0] # board size
         assert self.N > 2 # Cannot deal with 2x2
@@ -29,37 +266,476 @@ class CellularAutomaton():
             [1, 1, 1],
         ])
         self.periodic_boundary = periodic_boundary
+        assert engine in ENGINES
+        if engine == "numba" and fused_step_kernel() is None:
+            warnings.warn("numba is not available, using the table engine")
+            engine = "table"
+        self.engine = engine
+        assert sampling in SAMPLINGS
+        self.sampling = sampling
+        # Step threads horizontal stripes of the grid in parallel, see
+        # striped_next_grid
+        assert 1 <= threads <= self.N
+        assert not (threads > 1 and (active_region or engine == "numba"))
+        self.threads = threads
+        self._executor = None
+        # The numba engine and striped steps count the ALIVE neighbors
+        # themselves, so the stored counts are only computed on demand
+        self._life_neighborhood_grid = None
+        # State counts of the grid computed by the numba engine
+        self._state_counts, self._state_counts_grid = None, None
+        # Update ALIVE neighbor counts only around cells that changed, as long
+        # as at most incremental_max_fraction of the cells changed
+        self.incremental = incremental
+        self.incremental_max_fraction = 0.01
+        self._neighbor_offsets = np.array(
+            [(di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)
+             if (di, dj) != (0, 0)])
+        # Compute steps into a second grid buffer with preallocated scratch
+        # arrays, swapping the buffers after each step, see advance
+        assert not (buffered and (engine == "mask" or active_region
+                                  or threads > 1))
+        self.buffered = buffered
+        if buffered:
+            self._back = np.empty_like(self.grid)
+            shape = self.grid.shape
+            self._scratch = {
+                "alive": np.empty(shape, dtype=self.count_dtype),
+                "idx": np.empty(shape, dtype=np.intp),
+                "random": np.empty(shape),
+                "birth": np.empty(shape, dtype=bool),
+                "decision": np.empty(shape, dtype=bool),
+            }
+        # Only update the bounding box of non-DEAD cells plus a one cell halo
+        assert not (active_region and engine == "numba")
+        self.active_region = active_region
+        self._bbox, self._bbox_grid = None, None
+        # Period of the cycle found by find_cycle, 1 for fixed points
+        self.period = None
+        # Callables observer(ca, transitions, old_grid, new_grid, region),
+        # notified after every stored step, see add_observer
+        self.observers = []
+        # util.Profiler timing the phases of the steps, see phase
+        self.profiler = None
+        self._striping = False
         if seed is not None:
             self.rng = np.random.default_rng(seed)
         else:
             self.rng = np.random.default_rng()
+        # Independent random streams of the stripes
+        self.stripe_rngs = self.rng.spawn(threads) if threads > 1 else []
     
     def count_state(self, state: int):
+        if self._state_counts_grid is self.grid:
+            return int(self._state_counts[state])
         return np.count_nonzero(self.grid == state)
-    
+
+    @property
+    def life_neighborhood_grid(self) -> np.ndarray:
+        if self._life_neighborhood_grid is None:
+            self._life_neighborhood_grid = self.neighborhood_grid(
+                ALIVE, self.periodic_boundary)
+        return self._life_neighborhood_grid
+
+    @life_neighborhood_grid.setter
+    def life_neighborhood_grid(self, c: np.ndarray):
+        self._life_neighborhood_grid = c
+
     def neighborhood_grid(self, state: int, periodic_boundary=True):
-        filtered_grid = (self.grid == state).astype(np.intc)
+        filtered_grid = (self.grid == state).astype(self.count_dtype)
         mode = "wrap" if periodic_boundary else "constant"
         c = convolve(filtered_grid, self.conv_ker, mode=mode, cval=0)
         return c
 
+    def update_life_neighborhood_grid(self, ngrid: np.ndarray):
+        """
+        Update life_neighborhood_grid from the ALIVE neighbor counts of the
+        stored grid to those of ngrid by adding +1 / -1 around the cells whose
+        ALIVE status flipped. Falls back to a full convolution of ngrid if more
+        than incremental_max_fraction of the cells flipped.
+        """
+        flipped = np.flatnonzero((self.grid == ALIVE) != (ngrid == ALIVE))
+        if flipped.size > self.incremental_max_fraction * self.N**2:
+            self.life_neighborhood_grid = convolve(
+                (ngrid == ALIVE).astype(self.count_dtype), self.conv_ker,
+                mode="wrap" if self.periodic_boundary else "constant", cval=0)
+            return
+        rows, cols = np.divmod(flipped, self.N)
+        # -1 wraps around for unsigned count_dtype, which is fine since the
+        # counts themselves never leave [0, 8]
+        delta = np.where(ngrid.flat[flipped] == ALIVE, 1, -1).astype(
+            self.count_dtype)
+        # Rows and columns of the 8 neighbors of each flipped cell
+        i = (rows + self._neighbor_offsets[:, :1]).ravel()
+        j = (cols + self._neighbor_offsets[:, 1:]).ravel()
+        delta = np.tile(delta, 8)
+        if self.periodic_boundary:
+            i %= self.N
+            j %= self.N
+        else:
+            inside = (0 <= i) & (i < self.N) & (0 <= j) & (j < self.N)
+            i, j, delta = i[inside], j[inside], delta[inside]
+        np.add.at(self.life_neighborhood_grid.reshape(-1), i * self.N + j,
+                  delta)
+
+    def update_grid(self, ngrid: np.ndarray):
+        """
+        Store ngrid as the new grid, update the ALIVE neighbor counts and
+        advance the time by one step.
+        """
+        if self.buffered:
+            # The previous grid becomes the back buffer
+            self._back = self.grid
+        if self.engine == "numba" or self.threads > 1:
+            self.grid = ngrid
+            self.life_neighborhood_grid = None
+            self.t += 1
+            return
+        with self.phase("neighbors"):
+            if self.incremental:
+                self.update_life_neighborhood_grid(ngrid)
+                self.grid = ngrid
+            elif self.buffered:
+                self.grid = ngrid
+                alive = np.equal(ngrid, ALIVE, out=self._scratch["alive"],
+                                 casting="unsafe")
+                convolve(alive, self.conv_ker,
+                         output=self.life_neighborhood_grid,
+                         mode="wrap" if self.periodic_boundary else "constant",
+                         cval=0)
+            else:
+                self.grid = ngrid
+                self.life_neighborhood_grid = self.neighborhood_grid(
+                    ALIVE, self.periodic_boundary)
+        self.t += 1
+
+    def bounding_box(self) -> tuple[int]:
+        """
+        Bounding box (row_min, row_max, col_min, col_max) of the non-DEAD cells,
+        with exclusive maxima. The box is empty if all cells are DEAD. It is
+        only recomputed from the whole grid if the grid was replaced since the
+        last step.
+        """
+        if self._bbox_grid is not self.grid:
+            self._bbox = _bounding_box(self.grid != DEAD)
+            self._bbox_grid = self.grid
+        return self._bbox
+
+    def active_slices(self) -> tuple[slice]:
+        """
+        Slices of the active region, i.e. the bounding box of the non-DEAD cells
+        plus a one cell halo, as only cells in there can change. Returns None if
+        the active region (plus the halo needed to count its neighbors) wraps
+        around a periodic boundary and the whole grid has to be updated.
+        """
+        r0, r1, c0, c1 = self.bounding_box()
+        if r0 == r1:
+            return slice(0, 0), slice(0, 0)
+        if self.periodic_boundary and (min(r0, c0) < 3
+                                       or max(r1, c1) > self.N - 3):
+            return None
+        return (slice(max(r0 - 1, 0), min(r1 + 1, self.N)),
+                slice(max(c0 - 1, 0), min(c1 + 1, self.N)))
+
+    def update_region(self, region: tuple[slice], nsub: np.ndarray):
+        """
+        Write the new cells nsub of the active region into the grid in place,
+        update the ALIVE neighbor counts around it and advance the time by one
+        step.
+        """
+        self.grid[region] = nsub
+        rows, cols = region
+        if rows.stop > rows.start:
+            # Counts change up to one cell beyond the region, their neighbors
+            # lie at most two cells beyond the region
+            outer = (slice(max(rows.start - 1, 0), min(rows.stop + 1, self.N)),
+                     slice(max(cols.start - 1, 0), min(cols.stop + 1, self.N)))
+            window = (slice(max(rows.start - 2, 0), min(rows.stop + 2, self.N)),
+                      slice(max(cols.start - 2, 0), min(cols.stop + 2, self.N)))
+            with self.phase("neighbors"):
+                c = convolve(
+                    (self.grid[window] == ALIVE).astype(self.count_dtype),
+                    self.conv_ker, mode="constant", cval=0)
+                self.life_neighborhood_grid[outer] = c[
+                    outer[0].start - window[0].start:
+                    outer[0].stop - window[0].start,
+                    outer[1].start - window[1].start:
+                    outer[1].stop - window[1].start]
+            with self.phase("bookkeeping"):
+                r0, r1, c0, c1 = _bounding_box(nsub != DEAD)
+            if r0 == r1:
+                self._bbox = (0, 0, 0, 0)
+            else:
+                self._bbox = (rows.start + r0, rows.start + r1,
+                              cols.start + c0, cols.start + c1)
+        self._bbox_grid = self.grid
+        self.t += 1
+
+    def advance(self, silent: bool = False, scramble: bool = False,
+                **kwargs) -> np.ndarray:
+        """
+        Compute the next grid with next_grid, passing on kwargs, and store it
+        unless the step is silent.
+        With active_region, only the active region is updated, in place. The
+        returned grid then is the stored grid itself and changes with the next
+        step. Random numbers are only drawn for the active region, so
+        stochastic steps are equal in distribution but not in random stream to
+        steps on the whole grid.
+        With buffered, the next grid is computed into the back buffer, which
+        becomes the stored grid while the previous grid becomes the back
+        buffer. The returned grid is then only valid until the step after the
+        next one (or until the next step if it is silent) overwrites it, so
+        callers that keep it have to copy it. Steps with the table engine and
+        full sampling do not allocate any grid sized arrays, only observers
+        and sparse sampling do.
+        """
+        region = None
+        if self.active_region and not scramble:
+            with self.phase("bookkeeping"):
+                region = self.active_slices()
+        if region is None:
+            if self.threads > 1:
+                ngrid = self.striped_next_grid(scramble=scramble, **kwargs)
+            else:
+                # The numba engine counts the ALIVE neighbors itself
+                c = (None if self.engine == "numba"
+                     else self.life_neighborhood_grid)
+                ngrid = self.next_grid(self.grid, c, scramble=scramble,
+                                       **kwargs)
+            if not silent:
+                old_grid = self.grid
+                self.update_grid(ngrid)
+                if self.observers:
+                    self.notify(old_grid, ngrid, (slice(None), slice(None)))
+            return ngrid
+        nsub = self.next_grid(self.grid[region],
+                              self.life_neighborhood_grid[region], **kwargs)
+        if silent:
+            ngrid = self.grid.copy()
+            ngrid[region] = nsub
+            return ngrid
+        # The region is overwritten in place, keep its old state for observers
+        old_sub = self.grid[region].copy() if self.observers else None
+        self.update_region(region, nsub)
+        if self.observers:
+            self.notify(old_sub, nsub, region)
+        return self.grid
+
+    def add_observer(self, observer):
+        """
+        Register observer to be called as
+            observer(ca, transitions, old_grid, new_grid, region)
+        after every stored (non-silent) step of advance, where ca is this
+        automaton with ca.t and ca.grid already updated. transitions is the
+        (3, 3) array of transition counts [from_state, to_state] over the whole
+        grid, so transitions.sum(axis=0) are the populations after the step.
+        old_grid and new_grid are the states before and after the step of the
+        cells in region, a tuple of slices into the grid, which is the whole
+        grid unless stepping the active region. Cells outside of region are
+        DEAD before and after the step. The arrays must not be modified.
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def notify(self, old_grid: np.ndarray, new_grid: np.ndarray,
+               region: tuple[slice]):
+        """
+        Compute the transition counts of a step on region and pass them to the
+        observers, see add_observer.
+        """
+        with self.phase("bookkeeping"):
+            transitions = transition_counts(old_grid, new_grid)
+            # Cells outside of the region stayed DEAD
+            transitions[DEAD, DEAD] += self.N * self.N - old_grid.size
+        with self.phase("observers"):
+            for observer in self.observers:
+                observer(self, transitions, old_grid, new_grid, region)
+
+    def phase(self, name: str):
+        """
+        Context timing the phase name of a step (see PHASES) in profiler, or
+        doing nothing if there is no profiler. Phases are not timed within the
+        stripes of striped steps, which run in parallel.
+        """
+        if self.profiler is None or self._striping:
+            return _NO_PHASE
+        return self.profiler.phase(name)
+
+    def next_grid(self, grid: np.ndarray, c: np.ndarray,
+                  **kwargs) -> np.ndarray:
+        raise NotImplementedError("Instance of CellularAutomaton does not implement rules!")
+
+    def fused_next_grid(self, grid: np.ndarray, table: np.ndarray,
+                        death_p: float = 0,
+                        birth_p: float = None) -> np.ndarray:
+        """
+        Compute the next grid with the compiled fused_step for the numba
+        engine and keep the state counts of the new grid for count_state.
+        """
+        ngrid = self._back if self.buffered else np.empty_like(grid)
+        counts = np.zeros(3, dtype=np.int64)
+        with self.phase("fused"):
+            fused_step_kernel()(grid, table, self.periodic_boundary, death_p,
+                                -1. if birth_p is None else birth_p, self.rng,
+                                ngrid, counts)
+        self._state_counts, self._state_counts_grid = counts, ngrid
+        return ngrid
+
+    def stripes(self) -> list[slice]:
+        """
+        Row slices of the threads horizontal stripes of the grid.
+        """
+        bounds = np.linspace(0, self.N, self.threads + 1).astype(int)
+        return [slice(r0, r1) for r0, r1 in zip(bounds[:-1], bounds[1:])]
+
+    def stripe_neighborhood_grid(self, grid: np.ndarray,
+                                 rows: slice) -> np.ndarray:
+        """
+        ALIVE neighbor counts of the cells of grid in rows, computed from the
+        rows and a one row halo above and below, which wraps around a periodic
+        boundary. Only uses NumPy operations that release the GIL.
+        """
+        N, r0, r1 = self.N, rows.start, rows.stop
+        # ALIVE cells of the stripe, the halo rows and a one column halo
+        padded = np.zeros((r1 - r0 + 2, N + 2), dtype=self.count_dtype)
+        np.equal(grid[rows], ALIVE, out=padded[1:-1, 1:-1], casting="unsafe")
+        if r0 > 0 or self.periodic_boundary:
+            np.equal(grid[r0 - 1], ALIVE, out=padded[0, 1:-1],
+                     casting="unsafe")
+        if r1 < N or self.periodic_boundary:
+            np.equal(grid[r1 % N], ALIVE, out=padded[-1, 1:-1],
+                     casting="unsafe")
+        if self.periodic_boundary:
+            padded[:, 0] = padded[:, -2]
+            padded[:, -1] = padded[:, 1]
+        c = padded[:-2, :-2] + padded[:-2, 1:-1]
+        for di, dj in self._neighbor_offsets[2:]:
+            c += padded[1 + di:r1 - r0 + 1 + di, 1 + dj:N + 1 + dj]
+        return c
+
+    def striped_next_grid(self, scramble: bool = False,
+                          **kwargs) -> np.ndarray:
+        """
+        Compute the next grid with next_grid, passing on kwargs, in parallel
+        on the stripes of the grid in a pool of threads threads. Each stripe
+        counts its ALIVE neighbors itself and draws from its own random stream
+        in stripe_rngs, so stochastic steps are equal in distribution but not
+        in random stream to unstriped steps. The whole grid is scrambled at
+        the end, after SPOREs died, which is equal in distribution as well.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads)
+        grid, ngrid = self.grid, np.empty_like(self.grid)
+
+        def step_stripe(rows, rng):
+            c = self.stripe_neighborhood_grid(grid, rows)
+            ngrid[rows] = self.next_grid(grid[rows], c, rng=rng, **kwargs)
+
+        with self.phase("stripes"):
+            self._striping = True
+            try:
+                # list raises the exceptions of the threads
+                list(self._executor.map(step_stripe, self.stripes(),
+                                        self.stripe_rngs))
+            finally:
+                self._striping = False
+        return self.scramble(ngrid) if scramble else ngrid
+
+    def close(self):
+        """
+        Shut down the threads of striped steps. Further striped steps start
+        new ones.
+        """
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def _table_step_buffers(self) -> dict:
+        """
+        Output and index buffers of table_step for buffered steps.
+        """
+        if not self.buffered:
+            return {}
+        return {"out": self._back, "idx": self._scratch["idx"]}
+
+    def birth_decisions(self, grid: np.ndarray, c: np.ndarray, p: float,
+                        rng: np.random.Generator) -> np.ndarray:
+        """
+        Boolean mask of the cells of grid that are born with probability p if
+        they have 4 ALIVE neighbors, see sampling. Sparse sampling only draws
+        for the cells that are not ALIVE and have 4 ALIVE neighbors.
+        """
+        if self.buffered and self.sampling == "full":
+            return np.less(rng.random(out=self._scratch["random"]), p,
+                           out=self._scratch["birth"])
+        if self.sampling == "full":
+            return rng.random(grid.shape) < p
+        if self.buffered:
+            birth = self._scratch["birth"]
+            birth[...] = False
+        else:
+            birth = np.zeros(grid.shape, dtype=bool)
+        candidates = np.flatnonzero((c == 4) & (grid != ALIVE))
+        birth.flat[random_subset(rng, candidates, p)] = True
+        return birth
+
     def scramble(self, grid=None):
         """
         Scrambles the grid, i.e. randomly rearanges the cells. If no grid is
         passed, uses stored grid, else, uses passed grid.
         """
-        if grid is None:
-            grid = self.grid
-            self.grid = None
-        flat = grid.flatten()
-        self.rng.shuffle(flat)
-        grid = flat.reshape((self.N, self.N))
-        if self.grid is None:
-            self.grid = grid
-        return grid
+        with self.phase("scramble"):
+            if grid is None:
+                grid = self.grid
+                self.grid = None
+            elif self.buffered:
+                # Shuffle the back buffer in place, which draws the same
+                # permutation as shuffling a copy
+                self.rng.shuffle(grid.reshape(-1))
+                return grid
+            flat = grid.flatten()
+            self.rng.shuffle(flat)
+            grid = flat.reshape((self.N, self.N))
+            if self.grid is None:
+                self.grid = grid
+            return grid
     
     def reinit_grid(self):
         raise NotImplementedError("Instance of CellularAutomaton may not be initialized!")
+
+    def get_state(self) -> dict:
+        """
+        State of the automaton as restored by set_state: the grid, the time and
+        the state of the random number generator, so that a restored automaton
+        continues exactly like this one.
+        """
+        state = {"grid": self.grid.copy(), "t": self.t,
+                 "rng": self.rng.bit_generator.state}
+        if self.stripe_rngs:
+            state["stripe_rng"] = [rng.bit_generator.state
+                                   for rng in self.stripe_rngs]
+        return state
+
+    def set_state(self, state: dict):
+        self.grid = np.array(state["grid"], dtype=self.grid_dtype)
+        self.life_neighborhood_grid = self.neighborhood_grid(
+            ALIVE, self.periodic_boundary)
+        self.t = state["t"]
+        self.rng.bit_generator.state = state["rng"]
+        for rng, rng_state in zip(self.stripe_rngs,
+                                  state.get("stripe_rng", [])):
+            rng.bit_generator.state = rng_state
     
     def step(self, silent: bool = False) -> np.ndarray:
         raise NotImplementedError("Instance of CellularAutomaton does not implement rules!")
@@ -70,6 +746,66 @@ class CellularAutomaton():
             self.step()
         return self.grid
     
+    def is_deterministic(self, scramble: bool = False,
+                         overcrowd_birth_p: float = None, **kwargs) -> bool:
+        """
+        Whether steps with the given step arguments are deterministic.
+        """
+        return not scramble and overcrowd_birth_p is None
+
+    def find_cycle(self, t_max: int, max_period: int = 1000,
+                   **kwargs) -> tuple[int, int]:
+        """
+        Step the deterministic system until its grid repeats, passing kwargs to
+        step, and return the time the cycle was entered and its period. The
+        period is also stored as self.period, a fixed point has period 1.
+        Grids are hashed into a rolling table of the last max_period steps, so
+        only cycles with periods up to max_period are found. Returns (-1, 0) if
+        no cycle was found until t_max.
+        The system is left at the time the grid first repeats, i.e. at the
+        entry time plus the period, with the grid it entered the cycle with.
+        Without a cycle, it is left at t_max + 1.
+        """
+        assert self.is_deterministic(**kwargs)
+        seen, order = {}, deque()
+        while self.t <= t_max:
+            key = hashlib.blake2b(self.grid.tobytes(), digest_size=16).digest()
+            t0 = seen.get(key)
+            if t0 is not None:
+                # Confirm the cycle exactly on a copy to rule out hash
+                # collisions
+                period, ca = self.t - t0, self.detached_copy()
+                for _ in range(period):
+                    ca.step(**kwargs)
+                if np.array_equal(ca.grid, self.grid):
+                    self.period = period
+                    return t0, period
+            seen[key] = self.t
+            order.append(key)
+            if len(order) > max_period:
+                del seen[order.popleft()]
+            self.step(**kwargs)
+        return -1, 0
+
+    def detached_copy(self) -> "CellularAutomaton":
+        """
+        Copy of the automaton in its current state that can be stepped without
+        affecting it, with its own grid, neighbor counts, buffers and random
+        streams, but without observers and profiler.
+        """
+        ca = copy.copy(self)
+        ca.observers, ca.profiler = [], None
+        # Striped steps of the copy start their own threads
+        ca._executor = None
+        ca.rng = np.random.default_rng()
+        ca.stripe_rngs = [np.random.default_rng() for _ in self.stripe_rngs]
+        if self.buffered:
+            ca._back = np.empty_like(self._back)
+            ca._scratch = {name: np.empty_like(array)
+                           for name, array in self._scratch.items()}
+        ca.set_state(self.get_state())
+        return ca
+
     def state_count_time_series(self, t_max: int, state: int,
                                 **kwargs) -> np.ndarray:
         """
@@ -87,10 +823,15 @@ class CellularAutomaton():
 
 class GameOfLife(CellularAutomaton):
     def __init__(self, init_grid: np.ndarray, seed: int = None,
-                 periodic_boundary: bool = True):
+                 periodic_boundary: bool = True, engine: str = "mask",
+                 incremental: bool = False, active_region: bool = False,
+                 threads: int = 1, sampling: str = "full",
+                 buffered: bool = False):
         # 0: dead, 1: alive
-        self.states = np.array([DEAD, ALIVE])
-        super().__init__(init_grid, self.states, seed, periodic_boundary)
+        self.states = np.array([DEAD, ALIVE], dtype=self.grid_dtype)
+        super().__init__(init_grid, self.states, seed, periodic_boundary,
+                         engine, incremental, active_region, threads,
+                         sampling, buffered)
         self.life_neighborhood_grid = self.neighborhood_grid(ALIVE, self.periodic_boundary)
     
     @property
@@ -105,48 +846,76 @@ class GameOfLife(CellularAutomaton):
         p_dead = 1 - p_alive
         dims = (self.N, self.N)
         self.grid = self.rng.choice(self.states, p=(p_dead, p_alive), size=dims)
+        self.life_neighborhood_grid = self.neighborhood_grid(
+            ALIVE, self.periodic_boundary)
     
-    def step(self, silent: bool = False, scramble: bool = False,
-             overcrowd_birth_p: float = None) -> np.ndarray:
+    def next_grid(self, grid: np.ndarray, c: np.ndarray,
+                  scramble: bool = False,
+                  overcrowd_birth_p: float = None,
+                  rng: np.random.Generator = None) -> np.ndarray:
         """
-        Perform a step in Game of Life.
-        A silent step is only computed and returned but does not count as a time
-        step and is not stored.
+        Apply the rules of Game of Life to grid with ALIVE neighbor counts c,
+        drawing from rng instead of self.rng if given.
         """
-        ngrid = self.grid.copy()
-        # Create array with 8-neighbor sums by convolution, using periodic
-        # boundary conditions.
-        c = self.life_neighborhood_grid
-        # Apply rules of game of life
-        ngrid[(self.grid == ALIVE) & ((c < 2) | (c > 3))] = DEAD
+        if rng is None:
+            rng = self.rng
+        if self.engine == "numba":
+            ngrid = self.fused_next_grid(grid, GAME_OF_LIFE_TABLE,
+                                         birth_p=overcrowd_birth_p)
+            return self.scramble(ngrid) if scramble else ngrid
         # Birth with 4 ALIVE neighbors with probability overcrowd_birth_p
+        birth = None
         if overcrowd_birth_p is not None:
-            decision_grid = self.rng.random((self.N, self.N))
-            ngrid[(self.grid == DEAD) & (c == 4)
-                  & (decision_grid < overcrowd_birth_p)] = ALIVE
-        ngrid[(self.grid == DEAD) & (c == 3)] = ALIVE
+            with self.phase("births"):
+                birth = self.birth_decisions(grid, c, overcrowd_birth_p, rng)
+        # Apply rules of game of life
+        with self.phase("rule"):
+            if self.engine == "table":
+                ngrid = table_step(GAME_OF_LIFE_TABLE, grid, c, birth,
+                                   **self._table_step_buffers())
+            else:
+                ngrid = game_of_life_rule(grid, c, birth)
         # Scramble
         if scramble:
             ngrid = self.scramble(ngrid)
-        # Update grid and time
-        if not silent:
-            self.grid = ngrid
-            self.life_neighborhood_grid = self.neighborhood_grid(
-                ALIVE, self.periodic_boundary)
-            self.t += 1
         return ngrid
+
+    def step(self, silent: bool = False, scramble: bool = False,
+             overcrowd_birth_p: float = None) -> np.ndarray:
+        """
+        Perform a step in Game of Life.
+        A silent step is only computed and returned but does not count as a time
+        step and is not stored.
+        """
+        return self.advance(silent, scramble=scramble,
+                            overcrowd_birth_p=overcrowd_birth_p)
     
 
 class SporeLife(CellularAutomaton):
     def __init__(self, init_grid: np.ndarray, alpha: float = 1,
-                 seed: int = None, periodic_boundary: bool = True):
+                 seed: int = None, periodic_boundary: bool = True,
+                 engine: str = "mask", incremental: bool = False,
+                 active_region: bool = False, threads: int = 1,
+                 sampling: str = "full", buffered: bool = False):
         """
         For alpha = 1 we get deterministic SporeLife, for alpha = 0 we get Game
-        of Life.
+        of Life. The engine ("mask" or "table") determines how the rules are
+        applied, both give identical results. If incremental is true, the ALIVE
+        neighbor counts are only updated around cells that changed. If
+        active_region is true, only the bounding box of non-DEAD cells is
+        updated, see CellularAutomaton.advance. With threads > 1, steps are
+        computed on horizontal stripes in parallel, see
+        CellularAutomaton.striped_next_grid, whose threads are shut down by
+        close or at the end of a with block. The sampling ("full" or "sparse")
+        determines how random decisions are drawn, see SAMPLINGS. If buffered
+        is true, steps of the table or numba engine reuse two grid buffers
+        and do not allocate, see CellularAutomaton.advance.
         """
         # 0: dead, 1: alive, 2: spore
-        self.states = np.array([DEAD, ALIVE, SPORE])
-        super().__init__(init_grid, self.states, seed, periodic_boundary)
+        self.states = np.array([DEAD, ALIVE, SPORE], dtype=self.grid_dtype)
+        super().__init__(init_grid, self.states, seed, periodic_boundary,
+                         engine, incremental, active_region, threads,
+                         sampling, buffered)
 
         self.life_neighborhood_grid = self.neighborhood_grid(ALIVE, self.periodic_boundary)
         
@@ -173,7 +942,79 @@ class SporeLife(CellularAutomaton):
         dims = (self.N, self.N)
         prob = (p_dead, p_alive, p_dorm)
         self.grid = self.rng.choice(self.states, p=prob, size=dims)
+        self.life_neighborhood_grid = self.neighborhood_grid(
+            ALIVE, self.periodic_boundary)
     
+    def is_deterministic(self, scramble: bool = False,
+                         overcrowd_birth_p: float = None, **kwargs) -> bool:
+        """
+        Whether steps with the given step arguments are deterministic, which
+        requires that SPOREs always (alpha = 1) or never (alpha = 0) survive.
+        """
+        return (self.alpha in (0, 1)
+                and super().is_deterministic(scramble, overcrowd_birth_p))
+
+    def next_grid(self, grid: np.ndarray, c: np.ndarray,
+                  overcrowd_dormancy: bool = False,
+                  scramble: bool = False,
+                  overcrowd_birth_p: float = None,
+                  stochastic: bool = True,
+                  rng: np.random.Generator = None) -> np.ndarray:
+        """
+        Apply the rules of SporeLife to grid with ALIVE neighbor counts c,
+        drawing from rng instead of self.rng if given. If stochastic is false,
+        pretend that alpha = 1.
+        """
+        if rng is None:
+            rng = self.rng
+        if self.engine == "numba":
+            # SPOREs die independently, so before or after scrambling alike
+            ngrid = self.fused_next_grid(
+                grid, SPORE_LIFE_TABLE[int(overcrowd_dormancy)],
+                death_p=1-self.alpha if stochastic else 0,
+                birth_p=overcrowd_birth_p)
+            return self.scramble(ngrid) if scramble else ngrid
+        # Birth with 4 ALIVE neighbors with probability overcrowd_birth_p
+        birth = None
+        if overcrowd_birth_p is not None:
+            with self.phase("births"):
+                birth = self.birth_decisions(grid, c, overcrowd_birth_p, rng)
+        # Apply rules of game of life w/ dormancy
+        with self.phase("rule"):
+            if self.engine == "table":
+                ngrid = table_step(SPORE_LIFE_TABLE[int(overcrowd_dormancy)],
+                                   grid, c, birth,
+                                   **self._table_step_buffers())
+            else:
+                ngrid = spore_life_rule(grid, c, overcrowd_dormancy, birth)
+        # Scramble
+        if scramble:
+            ngrid = self.scramble(ngrid)
+        # Randomly kill SPOREs in ngrid based on alpha
+        if stochastic:
+            with self.phase("decay"):
+                self.kill_spores(ngrid, 1 - self.alpha, rng)
+        return ngrid
+
+    def kill_spores(self, ngrid: np.ndarray, p: float,
+                    rng: np.random.Generator):
+        """
+        Kill each SPORE of ngrid in place with probability p, see sampling.
+        Sparse sampling only draws for the SPOREs, and not at all if p is 0.
+        """
+        if self.buffered and self.sampling == "full":
+            decision = np.less(rng.random(out=self._scratch["random"]), p,
+                               out=self._scratch["decision"])
+            # The birth decisions of the step are not needed anymore
+            decision &= np.equal(ngrid, SPORE, out=self._scratch["birth"])
+            ngrid[decision] = DEAD
+        elif self.sampling == "full":
+            decision_grid = rng.random(ngrid.shape)
+            ngrid[(ngrid == SPORE) & (decision_grid < p)] = DEAD
+        elif p > 0:
+            ngrid.flat[random_subset(rng, np.flatnonzero(ngrid == SPORE),
+                                     p)] = DEAD
+
     def deterministic_step(self, silent: bool = False,
                            overcrowd_dormancy: bool = False,
                            scramble: bool = False,
@@ -187,46 +1028,10 @@ class SporeLife(CellularAutomaton):
         dormant, else it just dies.
         If scramble is true, scrambles the grid after performing the updates.
         """
-        ngrid = self.grid.copy()
-        # Create array with 8-neighbor ALIVE counts by convolution, using
-        # periodic boundary conditions.
-        c = self.life_neighborhood_grid
-        # Apply rules of game of life w/ dormancy
-        # DEAD awake
-        ngrid[(self.grid == DEAD)
-              & (c == 3)] = ALIVE
-        # DORMANT awake
-        ngrid[(self.grid == SPORE)
-              & ((c == 2) | (c == 3))] = ALIVE
-        # Birth with 4 ALIVE neighbors with probability overcrowd_birth_p
-        if overcrowd_birth_p is not None:
-            decision_grid = self.rng.random((self.N, self.N))
-            ngrid[((self.grid == DEAD) | (self.grid == SPORE)) & (c == 4)
-                  & (decision_grid < overcrowd_birth_p)] = ALIVE
-        if overcrowd_dormancy:
-            overcrowd_lim = 4
-        else:
-            overcrowd_lim = 3
-        # ALIVE dies
-        ngrid[(self.grid == ALIVE)
-              & ((c < 1) | (c > overcrowd_lim))] = DEAD
-        # ALIVE goes DORMANT
-        if overcrowd_dormancy:
-            ngrid[(self.grid == ALIVE)
-                & ((c == 1) | (c == 4))] = SPORE
-        else:
-            ngrid[(self.grid == ALIVE)
-                & (c == 1)] = SPORE
-        # Scramble
-        if scramble:
-            ngrid = self.scramble(ngrid)
-        # Update grid and time
-        if not silent:
-            self.grid = ngrid
-            self.life_neighborhood_grid = self.neighborhood_grid(
-                ALIVE, self.periodic_boundary)
-            self.t += 1
-        return ngrid
+        return self.advance(silent, scramble=scramble,
+                            overcrowd_dormancy=overcrowd_dormancy,
+                            overcrowd_birth_p=overcrowd_birth_p,
+                            stochastic=False)
 
     def step(self, silent: bool = False,
              overcrowd_dormancy: bool = False,
@@ -239,18 +1044,165 @@ class SporeLife(CellularAutomaton):
         If overcrowd_dormancy is true, an ALIVE cell with 4 ALIVE neighbors goes
         dormant, else it just dies.
         """
-        ngrid = self.deterministic_step(silent=True,
-                                        overcrowd_dormancy=overcrowd_dormancy,
-                                        scramble=scramble,
-                                        overcrowd_birth_p=overcrowd_birth_p)
-        # Randomly kill SPOREs in ngrid based on alpha
-        decision_grid = self.rng.random((self.N, self.N))
-        ngrid[(ngrid == SPORE)
-              & (decision_grid < (1-self.alpha))] = DEAD
-        # Update grid and time
-        if not silent:
-            self.grid = ngrid
-            self.life_neighborhood_grid = self.neighborhood_grid(
+        return self.advance(silent, scramble=scramble,
+                            overcrowd_dormancy=overcrowd_dormancy,
+                            overcrowd_birth_p=overcrowd_birth_p)
+
+
+class SporeLifeEnsemble():
+    """
+    Ensemble of R independent SporeLife realizations on N x N grids, stored as
+    a single (R, N, N) array and stepped all at once. Each realization draws
+    from its own random number generator, so realization i reproduces a
+    SporeLife seeded with seeds[i] and the same sampling.
+    """
+    def __init__(self, init_grids: np.ndarray, alpha: float = 1,
+                 seeds: list[int] = None, periodic_boundary: bool = True,
+                 sampling: str = "full"):
+        # Ensure that init_grids is a stack of quadratic grids only filled with
+        # states
+        assert (len(init_grids.shape) == 3
+                and init_grids.shape[1] == init_grids.shape[2])
+        self.states = np.array([DEAD, ALIVE, SPORE], dtype=np.uint8)
+        assert np.all(np.isin(init_grids, self.states))
+        self.grids = np.array(init_grids, dtype=np.uint8)
+        self.t = 0
+        self.R, self.N = init_grids.shape[0], init_grids.shape[1]
+        assert self.N > 2 # Cannot deal with 2x2
+
+        # convolution kernel, not coupling different realizations
+        self.conv_ker = np.array([[
+            [1, 1, 1],
+            [1, 0, 1],
+            [1, 1, 1],
+        ]])
+        self.periodic_boundary = periodic_boundary
+        assert sampling in SAMPLINGS
+        self.sampling = sampling
+        if seeds is None:
+            seeds = np.random.SeedSequence().spawn(self.R)
+        assert len(seeds) == self.R
+        self.rngs = [np.random.default_rng(seed) for seed in seeds]
+        # util.Profiler timing the phases of the steps, see phase
+        self.profiler = None
+
+        self.life_neighborhood_grids = self.neighborhood_grids(
+            ALIVE, self.periodic_boundary)
+
+        assert 0 <= alpha <= 1
+        self.alpha = alpha
+
+    def count_state(self, state: int) -> np.ndarray:
+        return np.count_nonzero(self.grids == state, axis=(1, 2))
+
+    @property
+    def alive_count(self) -> np.ndarray:
+        return self.count_state(ALIVE)
+
+    @property
+    def spore_count(self) -> np.ndarray:
+        return self.count_state(SPORE)
+
+    def neighborhood_grids(self, state: int,
+                           periodic_boundary=True) -> np.ndarray:
+        filtered_grids = (self.grids == state).astype(np.uint8)
+        mode = "wrap" if periodic_boundary else "constant"
+        return convolve(filtered_grids, self.conv_ker, mode=mode, cval=0)
+
+    def get_state(self) -> dict:
+        """
+        State of the ensemble as restored by set_state, see
+        CellularAutomaton.get_state.
+        """
+        return {"grid": self.grids.copy(), "t": self.t,
+                "rng": [rng.bit_generator.state for rng in self.rngs]}
+
+    def set_state(self, state: dict):
+        self.grids = np.array(state["grid"], dtype=np.uint8)
+        self.life_neighborhood_grids = self.neighborhood_grids(
+            ALIVE, self.periodic_boundary)
+        self.t = state["t"]
+        for rng, rng_state in zip(self.rngs, state["rng"]):
+            rng.bit_generator.state = rng_state
+
+    def phase(self, name: str):
+        """
+        Context timing the phase name of a step in profiler, see
+        CellularAutomaton.phase.
+        """
+        return _NO_PHASE if self.profiler is None else self.profiler.phase(name)
+
+    def _random_grids(self) -> np.ndarray:
+        """
+        Draw a random decision grid for each realization from its own stream.
+        """
+        decision_grids = np.empty(self.grids.shape)
+        for rng, decision_grid in zip(self.rngs, decision_grids):
+            rng.random(out=decision_grid)
+        return decision_grids
+
+    def _birth_decisions(self, c: np.ndarray, p: float) -> np.ndarray:
+        """
+        Birth decisions of each realization from its own stream, see
+        CellularAutomaton.birth_decisions.
+        """
+        if self.sampling == "full":
+            return self._random_grids() < p
+        birth = np.zeros(self.grids.shape, dtype=bool)
+        for rng, b, grid, c_grid in zip(self.rngs, birth, self.grids, c):
+            candidates = np.flatnonzero((c_grid == 4) & (grid != ALIVE))
+            b.flat[random_subset(rng, candidates, p)] = True
+        return birth
+
+    def _kill_spores(self, ngrids: np.ndarray, p: float):
+        """
+        Kill the SPOREs of each realization in place with probability p,
+        drawing from its own stream, see SporeLife.kill_spores.
+        """
+        if self.sampling == "full":
+            decision_grids = self._random_grids()
+            ngrids[(ngrids == SPORE) & (decision_grids < p)] = DEAD
+        elif p > 0:
+            for rng, ngrid in zip(self.rngs, ngrids):
+                ngrid.flat[random_subset(rng, np.flatnonzero(ngrid == SPORE),
+                                         p)] = DEAD
+
+    def scramble(self, grids: np.ndarray) -> np.ndarray:
+        """
+        Scrambles each realization in grids, i.e. randomly rearanges its cells.
+        """
+        for rng, grid in zip(self.rngs, grids):
+            flat = grid.flatten()
+            rng.shuffle(flat)
+            grid[...] = flat.reshape((self.N, self.N))
+        return grids
+
+    def step(self, overcrowd_dormancy: bool = False, scramble: bool = False,
+             overcrowd_birth_p: float = None) -> np.ndarray:
+        """
+        Perform a (possibly stochastic) step in all realizations of SporeLife.
+        If overcrowd_dormancy is true, an ALIVE cell with 4 ALIVE neighbors goes
+        dormant, else it just dies.
+        """
+        c = self.life_neighborhood_grids
+        # Birth with 4 ALIVE neighbors with probability overcrowd_birth_p
+        birth = None
+        if overcrowd_birth_p is not None:
+            with self.phase("births"):
+                birth = self._birth_decisions(c, overcrowd_birth_p)
+        with self.phase("rule"):
+            ngrids = table_step(SPORE_LIFE_TABLE[int(overcrowd_dormancy)],
+                                self.grids, c, birth)
+        if scramble:
+            with self.phase("scramble"):
+                ngrids = self.scramble(ngrids)
+        # Randomly kill SPOREs in ngrids based on alpha
+        with self.phase("decay"):
+            self._kill_spores(ngrids, 1 - self.alpha)
+        # Update grids and time
+        self.grids = ngrids
+        with self.phase("neighbors"):
+            self.life_neighborhood_grids = self.neighborhood_grids(
                 ALIVE, self.periodic_boundary)
-            self.t += 1
-        return ngrid
+        self.t += 1
+        return ngrids
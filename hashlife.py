@@ -0,0 +1,324 @@
+# Hashlife for deterministic SporeLife and Game of Life
+from collections import OrderedDict
+import numpy as np
+from gol import CellularAutomaton, GameOfLife, SporeLife
+from gol import DEAD, ALIVE, SPORE
+from gol import GAME_OF_LIFE_TABLE, SPORE_LIFE_TABLE
+
+
+class Node():
+    """
+    Quadtree node of a 2^level x 2^level block of cells with the four quadrants
+    nw, ne, sw, se. The quadrants of a level 1 node are cell states, all other
+    quadrants are nodes. Nodes are canonical, i.e. there is only one node per
+    block, so they are compared and hashed by identity.
+    """
+    __slots__ = ("level", "nw", "ne", "sw", "se", "alive", "spore", "bits",
+                 "array")
+
+    def __init__(self, level, nw, ne, sw, se):
+        self.level = level
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        if level == 1:
+            self.alive = (nw == ALIVE) + (ne == ALIVE) + (sw == ALIVE) + (se == ALIVE)
+            self.spore = (nw == SPORE) + (ne == SPORE) + (sw == SPORE) + (se == SPORE)
+            # ALIVE cells of the 2 x 2 block as bits of a 4 x 4 block, see
+            # _CENTER_COUNTS
+            self.bits = ((nw == ALIVE) | (ne == ALIVE) << 1
+                         | (sw == ALIVE) << 4 | (se == ALIVE) << 5)
+        else:
+            self.alive = nw.alive + ne.alive + sw.alive + se.alive
+            self.spore = nw.spore + ne.spore + sw.spore + se.spore
+        self.array = None
+
+
+def _center_counts() -> tuple[tuple[int]]:
+    """
+    Number of ALIVE neighbors of the center cells (1, 1), (1, 2), (2, 1) and
+    (2, 2) of a 4 x 4 block for each of the 2^16 patterns of ALIVE cells, where
+    cell (i, j) is bit 4 i + j of the pattern.
+    """
+    patterns = np.arange(2**16)
+    alive = ((patterns[:, None] >> np.arange(16)) & 1).reshape(-1, 4, 4)
+    counts = [alive[:, i-1:i+2, j-1:j+2].sum(axis=(1, 2)) - alive[:, i, j]
+              for i, j in ((1, 1), (1, 2), (2, 1), (2, 2))]
+    return tuple(map(tuple, np.array(counts).T.tolist()))
+
+
+_CENTER_COUNTS = _center_counts()
+
+
+class HashLife():
+    """
+    Memoized quadtree evolution of a deterministic three state automaton whose
+    rule table is indexed by [state, number of ALIVE neighbors]. Both the
+    canonical nodes and the memoized results are kept in least recently used
+    caches with at most max_nodes entries each, so memory stays bounded during
+    long runs. Evicted entries are simply recomputed when needed again.
+    """
+    def __init__(self, table: np.ndarray, max_nodes: int = 1_000_000):
+        assert table.shape == (3, 9)
+        # DEAD cells without ALIVE neighbors stay DEAD, so empty blocks stay
+        # empty
+        assert table[DEAD, 0] == DEAD
+        self.table = tuple(tuple(int(x) for x in row) for row in table)
+        self.max_nodes = max_nodes
+        self.nodes = OrderedDict()
+        self.results = OrderedDict()
+        self._empty = {}
+
+    def join(self, nw, ne, sw, se) -> Node:
+        """
+        Canonical node with the quadrants nw, ne, sw, se.
+        """
+        key = (nw, ne, sw, se)
+        node = self.nodes.get(key)
+        if node is not None:
+            self.nodes.move_to_end(key)
+            return node
+        level = 1 if isinstance(nw, int) else nw.level + 1
+        node = Node(level, nw, ne, sw, se)
+        self.nodes[key] = node
+        if len(self.nodes) > self.max_nodes:
+            self.nodes.popitem(last=False)
+        return node
+
+    def empty(self, level: int) -> Node:
+        """
+        Node of DEAD cells at level.
+        """
+        if level not in self._empty:
+            child = DEAD if level == 1 else self.empty(level - 1)
+            self._empty[level] = self.join(child, child, child, child)
+        return self._empty[level]
+
+    def center(self, node: Node) -> Node:
+        """
+        Center block of half the size of node.
+        """
+        return self.join(node.nw.se, node.ne.sw, node.sw.ne, node.se.nw)
+
+    def _base(self, node: Node) -> Node:
+        """
+        Advance the center 2 x 2 cells of the 4 x 4 node by one step.
+        """
+        nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+        c = _CENTER_COUNTS[nw.bits | ne.bits << 2 | sw.bits << 8 | se.bits << 10]
+        table = self.table
+        return self.join(table[nw.se][c[0]], table[ne.sw][c[1]],
+                         table[sw.ne][c[2]], table[se.nw][c[3]])
+
+    def successor(self, node: Node, j: int) -> Node:
+        """
+        Center block of half the size of node, advanced by 2^j steps, where
+        j <= node.level - 2.
+        """
+        k = node.level
+        assert 2 <= k and 0 <= j <= k - 2
+        if node.alive == 0 and node.spore == 0:
+            return self.empty(k - 1)
+        key = (node, j)
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+            return result
+        if k == 2:
+            result = self._base(node)
+        else:
+            join = self.join
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            # Nine overlapping sub-blocks of half the size of node
+            subs = [
+                nw, join(nw.ne, ne.nw, nw.se, ne.sw), ne,
+                join(nw.sw, nw.se, sw.nw, sw.ne),
+                join(nw.se, ne.sw, sw.ne, se.nw),
+                join(ne.sw, ne.se, se.nw, se.ne),
+                sw, join(sw.ne, se.nw, sw.se, se.sw), se,
+            ]
+            if j == k - 2:
+                # Advance twice by 2^(k-3)
+                r = [self.successor(sub, k - 3) for sub in subs]
+                step = lambda sub: self.successor(sub, k - 3)
+            else:
+                # Advance once by 2^j
+                r = [self.center(sub) for sub in subs]
+                step = lambda sub: self.successor(sub, j)
+            result = join(step(join(r[0], r[1], r[3], r[4])),
+                          step(join(r[1], r[2], r[4], r[5])),
+                          step(join(r[3], r[4], r[6], r[7])),
+                          step(join(r[4], r[5], r[7], r[8])))
+        self.results[key] = result
+        if len(self.results) > self.max_nodes:
+            self.results.popitem(last=False)
+        return result
+
+    def advance_torus(self, node: Node, j: int) -> Node:
+        """
+        Advance node, seen as a torus with periodic boundaries, by 2^j steps,
+        where j < node.level. The tiling of 2 x 2 copies of node evolves like
+        the torus, its center block is the torus shifted by half its size.
+        """
+        assert 0 <= j < node.level
+        shifted = self.successor(self.join(node, node, node, node), j)
+        return self.join(shifted.se, shifted.sw, shifted.ne, shifted.nw)
+
+    def from_array(self, grid: np.ndarray) -> Node:
+        """
+        Quadtree of the 2^k x 2^k grid. Only one node is built per distinct
+        block of each level.
+        """
+        N = grid.shape[0]
+        assert grid.shape == (N, N) and N >= 2 and N & (N - 1) == 0
+        nodes = [DEAD, ALIVE, SPORE]
+        idx = grid.astype(np.intp)
+        while idx.shape[0] > 1:
+            n = idx.shape[0] // 2
+            # Indices of the quadrants of each block of the next level
+            quads = np.stack([idx[0::2, 0::2], idx[0::2, 1::2],
+                              idx[1::2, 0::2], idx[1::2, 1::2]], axis=-1)
+            unique, inverse = np.unique(quads.reshape(-1, 4), axis=0,
+                                        return_inverse=True)
+            nodes = [self.join(*(nodes[q] for q in quad)) for quad in unique]
+            idx = inverse.reshape(n, n)
+        return nodes[idx[0, 0]]
+
+    def to_array(self, node: Node) -> np.ndarray:
+        """
+        Cells of node as array.
+        """
+        if node.array is not None:
+            return node.array
+        size = 2**node.level
+        grid = np.zeros((size, size), dtype=np.uint8)
+        if node.alive or node.spore:
+            h = size // 2
+            if node.level == 1:
+                grid[:] = [[node.nw, node.ne], [node.sw, node.se]]
+            else:
+                grid[:h, :h] = self.to_array(node.nw)
+                grid[:h, h:] = self.to_array(node.ne)
+                grid[h:, :h] = self.to_array(node.sw)
+                grid[h:, h:] = self.to_array(node.se)
+        # Keep small blocks, they are shared by many nodes
+        if node.level <= 4:
+            node.array = grid
+        return grid
+
+
+class _HashLifeMixin():
+    """
+    Storage of the grid as a quadtree root evolved by HashLife. The grid and the
+    ALIVE neighbor counts are computed on demand. Only periodic boundaries and
+    grid sizes that are powers of 2 are supported.
+    HashLife pays off once the dynamics became repetitive, during chaotic
+    transients plain stepping is faster. Long runs can thus step a GameOfLife
+    or SporeLife through the transient and continue from its grid here.
+    """
+    @property
+    def grid(self) -> np.ndarray:
+        if self._grid is None:
+            # Copy, small blocks are shared with the cache
+            self._grid = self.hashlife.to_array(self.root).copy()
+        return self._grid
+
+    @grid.setter
+    def grid(self, grid: np.ndarray):
+        self.root = self.hashlife.from_array(grid)
+        self._grid = None
+
+    @property
+    def life_neighborhood_grid(self) -> np.ndarray:
+        return self.neighborhood_grid(ALIVE, self.periodic_boundary)
+
+    def count_state(self, state: int) -> int:
+        if state == ALIVE:
+            return self.root.alive
+        if state == SPORE:
+            return self.root.spore
+        if state == DEAD:
+            return self.N**2 - self.root.alive - self.root.spore
+        return 0
+
+    def _init_hashlife(self, init_grid, table, max_nodes, seed):
+        N = init_grid.shape[0]
+        assert N & (N - 1) == 0, "HashLife needs grid sizes that are powers of 2"
+        self.hashlife = HashLife(table, max_nodes)
+        CellularAutomaton.__init__(self, init_grid, self.states, seed, True)
+
+    def _advance(self, j: int):
+        self.root = self.hashlife.advance_torus(self.root, j)
+        self._grid = None
+        self.t += 2**j
+
+    def set_state(self, state: dict):
+        self.grid = state["grid"]
+        self.t = state["t"]
+        self.rng.bit_generator.state = state["rng"]
+
+    def add_observer(self, observer):
+        raise NotImplementedError("Observers need the unpacked grids of every step!")
+
+    def step(self, silent: bool = False) -> np.ndarray:
+        """
+        Perform a step. A silent step is only computed and returned but does not
+        count as a time step and is not stored.
+        """
+        if silent:
+            return self.hashlife.to_array(
+                self.hashlife.advance_torus(self.root, 0)).copy()
+        self._advance(0)
+        return self.grid
+
+    def step_until(self, t: int) -> np.ndarray:
+        """
+        Step until time t in jumps of up to N / 2 steps.
+        """
+        assert self.t <= t
+        while self.t < t:
+            j = min((t - self.t).bit_length() - 1, self.root.level - 1)
+            self._advance(j)
+        return self.grid
+
+
+class HashGameOfLife(_HashLifeMixin, GameOfLife):
+    """
+    Game of Life evolved by HashLife, which can jump forward 2^j steps at once
+    on repetitive or sparse grids.
+    """
+    def __init__(self, init_grid: np.ndarray, seed: int = None,
+                 max_nodes: int = 1_000_000):
+        self.states = np.array([DEAD, ALIVE], dtype=self.grid_dtype)
+        self._init_hashlife(init_grid, GAME_OF_LIFE_TABLE[0], max_nodes, seed)
+
+    def reinit_grid(self, p_alive):
+        assert 0 <= p_alive <= 1
+        p_dead = 1 - p_alive
+        dims = (self.N, self.N)
+        self.grid = self.rng.choice(self.states, p=(p_dead, p_alive), size=dims)
+
+
+class HashSporeLife(_HashLifeMixin, SporeLife):
+    """
+    Deterministic SporeLife (alpha = 1) evolved by HashLife, which can jump
+    forward 2^j steps at once on repetitive or sparse grids.
+    If overcrowd_dormancy is true, an ALIVE cell with 4 ALIVE neighbors goes
+    dormant, else it just dies.
+    """
+    def __init__(self, init_grid: np.ndarray, overcrowd_dormancy: bool = False,
+                 seed: int = None, max_nodes: int = 1_000_000):
+        self.states = np.array([DEAD, ALIVE, SPORE], dtype=self.grid_dtype)
+        self.alpha = 1
+        self.overcrowd_dormancy = overcrowd_dormancy
+        self._init_hashlife(
+            init_grid, SPORE_LIFE_TABLE[int(overcrowd_dormancy), 0], max_nodes,
+            seed)
+
+    def reinit_grid(self, p_alive: float, p_dorm: float):
+        assert 0 <= p_alive <= 1 and 0 <= p_dorm <= 1 and p_alive + p_dorm < 1
+        p_dead = 1 - p_alive - p_dorm
+        dims = (self.N, self.N)
+        prob = (p_dead, p_alive, p_dorm)
+        self.grid = self.rng.choice(self.states, p=prob, size=dims)
+
+    def deterministic_step(self, silent: bool = False) -> np.ndarray:
+        return self.step(silent)
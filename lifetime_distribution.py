@@ -1,11 +1,79 @@
 import sys, os
 import numpy as np
 from collections import Counter
-from gol import SporeLife
+from gol import CellularAutomaton, SporeLife
 from gol import ALIVE, DEAD, SPORE
 from util import random_init_grid
 
 
+class LifetimeTracker():
+    """
+    Observer of a CellularAutomaton collecting how many steps cells stay in
+    their state before transitioning, for all states at once, see
+    add_observer. For every cell the time at which it entered its current
+    state is stored. When a cell leaves its state, its lifetime, i.e. the number
+    of steps it stayed in the state, is counted in a single growable histogram
+    indexed by lifetime * 4 + state, see histogram.
+    If ignore_transient_dynamics is true, cells that are already in their state
+    when tracking starts are ignored until they transition.
+    """
+    def __init__(self, ca: CellularAutomaton,
+                 ignore_transient_dynamics: bool = True):
+        self.entered = np.full((ca.N, ca.N), ca.t, dtype=np.int64)
+        if ignore_transient_dynamics:
+            self.entered[:] = -1 # marks cells with unknown entering time
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def __call__(self, ca: CellularAutomaton, transitions: np.ndarray,
+                 old_grid: np.ndarray, new_grid: np.ndarray,
+                 region: tuple[slice]):
+        entered = self.entered[region]
+        idx = np.flatnonzero(old_grid != new_grid)
+        left_entered = entered.take(idx)
+        # The step went from ca.t - 1 to ca.t
+        idx_hist = (ca.t - 1 - left_entered) * 4
+        idx_hist += old_grid.take(idx)
+        # Count lifetimes of ignored cells in the unused state 3
+        idx_hist[left_entered < 0] = 3
+        counts = np.bincount(idx_hist)
+        if counts.size > self.counts.size:
+            self.counts = np.concatenate((
+                self.counts,
+                np.zeros(counts.size - self.counts.size, dtype=np.int64)))
+        self.counts[:counts.size] += counts
+        entered.put(idx, ca.t)
+
+    def histogram(self, state: int) -> np.ndarray:
+        """
+        Lifetime histogram of state, the n-th entry counts the lifetimes n.
+        """
+        return self.counts[state::4]
+
+    def distribution(self, state: int) -> Counter:
+        """
+        Lifetime histogram of state as a counter of the nonzero entries.
+        """
+        hist = self.histogram(state)
+        return Counter({int(n): int(hist[n]) for n in np.flatnonzero(hist)})
+
+
+def lifetime_histograms(sl: SporeLife, t_max: int, t_trans: int,
+                        ignore_transient_dynamics: bool = True,
+                        states: tuple[int] = (ALIVE, SPORE)
+                        ) -> dict[int, np.ndarray]:
+    """
+    Step the given SporeLife until t_max and return the lifetime histograms of
+    all states in states, collected after the transient time t_trans in a
+    single run, see LifetimeTracker.
+    """
+    sl.step_until(t_trans)
+    tracker = LifetimeTracker(sl, ignore_transient_dynamics)
+    sl.add_observer(tracker)
+    sl.step_until(t_max)
+    sl.remove_observer(tracker)
+    return {state: tracker.histogram(state) for state in states}
+
+
 def lifetime_distribution(state: int, sl: SporeLife, t_max: int, t_trans: int,
                           ignore_transient_dynamics: bool = True) -> Counter:
     """
@@ -15,26 +83,9 @@ def lifetime_distribution(state: int, sl: SporeLife, t_max: int, t_trans: int,
     transitioning is returned as a counter. Optionally, ignore cells that
     transition to state within the transient time.
     """
-    lifetime_grid = np.zeros((sl.N, sl.N), dtype=np.intc)
     sl.step_until(t_trans)
-    # Mask to exclude cells that are state from the get-go
-    if ignore_transient_dynamics:
-        trans_mask = (sl.grid != state)
-    else:
-        trans_mask = np.ones((sl.N, sl.N), dtype=np.bool_)
-    data = Counter() # initialize distribution
-    while sl.t < t_max:
-        old_grid = sl.grid.copy()
-        new_grid = sl.step()
-        # Cells that are *still* in state add to lifetime grid
-        lifetime_grid += (trans_mask & 
-                          ((old_grid == state) & (new_grid == state)))
-        # Add lifetimes of cells that left state and reset lifetime grid
-        _mask = (trans_mask & 
-                 ((old_grid == state) & (new_grid != state)))
-        data.update(lifetime_grid[_mask])
-        lifetime_grid[_mask] = 0
-        # Update transient mask: set mask values to true for cells initially in
-        # state that left state.
-        trans_mask |= (np.logical_not(trans_mask) & (new_grid != state)) # FIXME
-    return data
+    tracker = LifetimeTracker(sl, ignore_transient_dynamics)
+    sl.add_observer(tracker)
+    sl.step_until(t_max)
+    sl.remove_observer(tracker)
+    return tracker.distribution(state)
@@ -1,7 +1,9 @@
 # mean field theory for spore life
 import random
+import numpy as np
+from scipy.special import comb
 from scipy.stats import binom
-import matplotlib.pyplot as plt
+from gol import ALIVE, DEAD, SPORE, SPORE_LIFE_TABLE
 
 class MFSporeLife:
     def __init__(self, init, alpha=1, n_neighbors=8, damping=0):
@@ -61,7 +63,318 @@ class MFSporeLife:
         return self.alive_densities, self.spore_densities, self.dead_densities
 
 
+
+def binomial_coefficients(n_neighbors) -> np.ndarray:
+    """
+    Binomial coefficients C(n_neighbors, n) for n = 1, 2, 3 stacked along the
+    first axis, for the array n_neighbors.
+    """
+    return np.stack([comb(n_neighbors, n) for n in (1, 2, 3)])
+
+
+def neighbor_probabilities(rho_a, n_neighbors, coefficients=None) -> tuple:
+    """
+    Probabilities P[n] of n = 1, 2, 3 ALIVE neighbors, i.e. the binomial
+    polynomials C(K, n) p^n (1-p)^(K-n) with K = n_neighbors >= 3 and
+    p = rho_a, evaluated on arrays. As in MFSporeLife, ALIVE densities of at
+    most 1e-4 are treated as 0. The binomial coefficients can be passed
+    precomputed.
+    """
+    if coefficients is None:
+        coefficients = binomial_coefficients(n_neighbors)
+    c1, c2, c3 = coefficients
+    p = np.where(rho_a > 1e-4, rho_a, 0.)
+    q = 1. - p
+    # p^n q^(K-n) from a single power q^(K-3), as K >= 3
+    qk = q**(n_neighbors - 3)
+    p2 = p * p
+    P3 = c3 * p2 * p * qk
+    qk *= q
+    P2 = c2 * p2 * qk
+    qk *= q
+    P1 = c1 * p * qk
+    return P1, P2, P3
+
+
+def mf_step(rho_a, rho_i, alpha, n_neighbors=8, damping=0,
+            coefficients=None) -> tuple:
+    """
+    The update of MFSporeLife.step on arrays: new ALIVE and SPORE densities
+    from the densities rho_a and rho_i, broadcast against the parameters.
+    """
+    P1, P2, P3 = neighbor_probabilities(rho_a, n_neighbors, coefficients)
+    # Kill spores randomly via alpha
+    killed_rho_i = rho_i * alpha
+    P23 = P2 + P3
+    new_rho_a = (rho_a + killed_rho_i) * P23 + (1. - rho_a - rho_i) * P3
+    new_rho_i = killed_rho_i * (1. - P23) + rho_a * P1
+    # Damp
+    new_rho_a = (1 - damping) * new_rho_a + damping * rho_a
+    new_rho_i = (1 - damping) * new_rho_i + damping * killed_rho_i
+    return new_rho_a, new_rho_i
+
+
+class BatchMFSporeLife:
+    """
+    Many MFSporeLife iterated at once. The initial densities init_alive and
+    init_spore and the parameters alpha, n_neighbors and damping are arrays
+    that are broadcast against each other, e.g. initial conditions along one
+    axis and alpha along another. The density histories are stored in
+    preallocated arrays of shape (t + 1, *shape).
+    """
+    def __init__(self, init_alive, init_spore, alpha=1, n_neighbors=8,
+                 damping=0):
+        self.t = 0
+        self.alpha = np.asarray(alpha, dtype=float)
+        assert np.all((0 <= self.alpha) & (self.alpha <= 1))
+        self.n_neighbors = np.asarray(n_neighbors)
+        assert np.all(self.n_neighbors >= 3)
+        self.damp = np.asarray(damping, dtype=float)
+        init_alive, init_spore = (np.asarray(init_alive, dtype=float),
+                                  np.asarray(init_spore, dtype=float))
+        assert np.all((init_alive >= 0) & (init_spore >= 0)
+                      & (init_alive + init_spore <= 1))
+        self.shape = np.broadcast_shapes(init_alive.shape, init_spore.shape,
+                                         self.alpha.shape,
+                                         self.n_neighbors.shape,
+                                         self.damp.shape)
+        self._coefficients = binomial_coefficients(self.n_neighbors)
+        self._alive = np.empty((1, *self.shape))
+        self._spore = np.empty((1, *self.shape))
+        self._alive[0], self._spore[0] = init_alive, init_spore
+
+    @property
+    def rho_a(self) -> np.ndarray:
+        return self._alive[self.t]
+
+    @property
+    def rho_i(self) -> np.ndarray:
+        return self._spore[self.t]
+
+    @property
+    def rho_d(self) -> np.ndarray:
+        return 1. - self.rho_a - self.rho_i
+
+    @property
+    def alive_densities(self) -> np.ndarray:
+        return self._alive[:self.t + 1]
+
+    @property
+    def spore_densities(self) -> np.ndarray:
+        return self._spore[:self.t + 1]
+
+    @property
+    def dead_densities(self) -> np.ndarray:
+        return 1. - self.alive_densities - self.spore_densities
+
+    def _reserve(self, n_steps: int):
+        """
+        Grow the history arrays to hold at least n_steps + 1 time steps.
+        """
+        if n_steps + 1 <= len(self._alive):
+            return
+        n_steps = max(n_steps + 1, 2 * len(self._alive))
+        for name in ("_alive", "_spore"):
+            history = np.empty((n_steps, *self.shape))
+            history[:self.t + 1] = getattr(self, name)[:self.t + 1]
+            setattr(self, name, history)
+
+    def step(self):
+        self._reserve(self.t + 1)
+        new_rho_a, new_rho_i = mf_step(self.rho_a, self.rho_i, self.alpha,
+                                       self.n_neighbors, self.damp,
+                                       self._coefficients)
+        self.t += 1
+        self._alive[self.t], self._spore[self.t] = new_rho_a, new_rho_i
+        return self.rho_a, self.rho_i, self.rho_d
+
+    def step_until(self, t_max):
+        # Steps like MFSporeLife.step_until, i.e. until t = t_max + 1
+        self._reserve(t_max + 1)
+        while self.t <= t_max:
+            self.step()
+        return self.alive_densities, self.spore_densities, self.dead_densities
+
+
+class PairSporeLife(BatchMFSporeLife):
+    """
+    Pair approximation of SporeLife, batched like BatchMFSporeLife. It tracks
+    the probabilities pairs[..., a, b] that two neighboring cells are in the
+    states a and b (DEAD, ALIVE, SPORE as in gol), starting from uncorrelated
+    pairs. Given its state a, the other n_neighbors - 1 neighbors of a cell are
+    assumed to be ALIVE independently with the conditional probability
+    q_a = pairs[a, ALIVE] / rho_a. As in SporeLife, the rules are applied first
+    and new SPOREs die with probability 1 - alpha. With damping, each cell
+    keeps its state with probability damping instead, SPOREs still dying with
+    probability 1 - alpha, which damps the densities like mf_step.
+    """
+    def __init__(self, init_alive, init_spore, alpha=1, n_neighbors=8,
+                 damping=0, overcrowd_dormancy=False):
+        super().__init__(init_alive, init_spore, alpha, n_neighbors, damping)
+        assert np.all(self.n_neighbors <= 8)
+        rho = np.zeros(self.shape + (3,))
+        rho[..., ALIVE], rho[..., SPORE] = init_alive, init_spore
+        rho[..., DEAD] = 1. - rho[..., ALIVE] - rho[..., SPORE]
+        self.pairs = rho[..., :, np.newaxis] * rho[..., np.newaxis, :]
+        # T[..., a, c, x], probability that a cell in state a with c ALIVE
+        # neighbors goes to state x
+        table = SPORE_LIFE_TABLE[int(overcrowd_dormancy), 0]
+        T = np.zeros(self.alpha.shape + (3, 9, 3))
+        T[..., :, :, :] = np.eye(3)[table]
+        alpha = self.alpha[..., np.newaxis, np.newaxis]
+        T[..., DEAD] += (1 - alpha) * T[..., SPORE]
+        T[..., SPORE] *= alpha
+        # Damped cells keep their state, K[..., a, x], and are mixed into
+        # the transitions with weight damping
+        K = np.zeros(self.alpha.shape + (3, 3))
+        K[..., DEAD, DEAD] = K[..., ALIVE, ALIVE] = 1
+        K[..., SPORE, SPORE], K[..., SPORE, DEAD] = self.alpha, 1 - self.alpha
+        damp = self.damp[..., np.newaxis, np.newaxis, np.newaxis]
+        T = (1 - damp) * T + damp * K[..., :, np.newaxis, :]
+        # T[..., a, b, k, x] for k ALIVE neighbors besides the neighbor in
+        # state b, which adds one ALIVE neighbor if b is ALIVE
+        shifted = np.stack([T[..., 0:8, :], T[..., 1:9, :]], axis=-3)
+        self._transitions = shifted[..., [int(b == ALIVE)
+                                          for b in (DEAD, ALIVE, SPORE)],
+                                    :, :]
+        # Binomial polynomials of n_neighbors - 1 neighbors, for k = 0, ..., 7
+        k = np.arange(8)
+        n_others = self.n_neighbors[..., np.newaxis, np.newaxis] - 1
+        self._binomial = (comb(n_others, k), np.maximum(n_others - k, 0))
+
+    def step(self):
+        self._reserve(self.t + 1)
+        rho = self.pairs.sum(axis=-1)
+        q = self.pairs[..., ALIVE] / np.where(rho > 0, rho, 1.)
+        q = q[..., np.newaxis]
+        # Distribution of the k ALIVE neighbors besides the paired one,
+        # B[..., a, k] for cells in state a
+        coefficients, exponents = self._binomial
+        B = coefficients * q**np.arange(8) * (1. - q)**exponents
+        # M[..., a, b, x], probability that a cell in state a paired with a
+        # neighbor in state b goes to state x, summed over k by matmul
+        M = (B[..., :, np.newaxis, np.newaxis, :] @ self._transitions)[..., 0, :]
+        self.pairs = np.einsum("...ab,...abx,...bay->...xy", self.pairs, M, M,
+                               optimize=True)
+        self.t += 1
+        self._alive[self.t] = self.pairs[..., ALIVE, :].sum(axis=-1)
+        self._spore[self.t] = self.pairs[..., SPORE, :].sum(axis=-1)
+        return self.rho_a, self.rho_i, self.rho_d
+
+
+def mf_jacobian(rho_a, rho_i, alpha, n_neighbors=8, damping=0) -> np.ndarray:
+    """
+    Jacobian of mf_step with respect to (rho_a, rho_i), as an array of shape
+    (..., 2, 2) for arrays broadcast against each other. Requires
+    n_neighbors >= 4. The derivatives of the binomial probabilities follow
+    from dB(n; K, p)/dp = K (B(n-1; K-1, p) - B(n; K-1, p)), and vanish
+    below the 1e-4 ALIVE density cutoff.
+    """
+    K = np.asarray(n_neighbors)
+    P1, P2, P3 = neighbor_probabilities(rho_a, K)
+    B1, B2, B3 = neighbor_probabilities(rho_a, K - 1)
+    p = np.where(rho_a > 1e-4, rho_a, 0.)
+    B0 = (1. - p)**(K - 1)
+    # Constant below the cutoff
+    dP = K * (rho_a > 1e-4)
+    dP1, dP2, dP3 = dP * (B0 - B1), dP * (B1 - B2), dP * (B2 - B3)
+    killed_rho_i = rho_i * alpha
+    S, dS = P2 + P3, dP2 + dP3
+    rho_d = 1. - rho_a - rho_i
+    J = np.empty(np.broadcast_shapes(np.shape(rho_a), np.shape(rho_i),
+                                     np.shape(alpha), K.shape,
+                                     np.shape(damping)) + (2, 2))
+    J[..., 0, 0] = S + (rho_a + killed_rho_i) * dS - P3 + rho_d * dP3
+    J[..., 0, 1] = alpha * S - P3
+    J[..., 1, 0] = -killed_rho_i * dS + P1 + rho_a * dP1
+    J[..., 1, 1] = alpha * (1. - S)
+    # Damp
+    J *= (1 - np.asarray(damping))[..., np.newaxis, np.newaxis]
+    J[..., 0, 0] += damping
+    J[..., 1, 1] += damping * np.asarray(alpha)
+    return J
+
+
+def find_fixed_points(rho_a, rho_i, alpha, n_neighbors=8, damping=0,
+                      tol: float = 1e-12, max_iter: int = 50) -> tuple:
+    """
+    Fixed points of mf_step found by Newton's method with the analytic
+    Jacobian, see mf_jacobian, starting from the arrays of initial guesses
+    rho_a and rho_i for the broadcast parameters. Iterates are kept in the
+    simplex of densities. Returns the ALIVE and SPORE densities of the fixed
+    points and whether Newton's method converged to tol.
+    """
+    rho_a, rho_i, alpha, n_neighbors, damping = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (rho_a, rho_i, alpha,
+                                               n_neighbors, damping)))
+    rho_a, rho_i = rho_a.copy(), rho_i.copy()
+    coefficients = binomial_coefficients(n_neighbors)
+    for _ in range(max_iter):
+        new_rho_a, new_rho_i = mf_step(rho_a, rho_i, alpha, n_neighbors,
+                                       damping, coefficients)
+        G_a, G_i = new_rho_a - rho_a, new_rho_i - rho_i
+        converged = np.maximum(np.abs(G_a), np.abs(G_i)) < tol
+        if np.all(converged):
+            break
+        J = mf_jacobian(rho_a, rho_i, alpha, n_neighbors, damping)
+        J[..., 0, 0] -= 1
+        J[..., 1, 1] -= 1
+        # Newton step -J^-1 G of the 2x2 systems, skipping singular ones
+        det = J[..., 0, 0] * J[..., 1, 1] - J[..., 0, 1] * J[..., 1, 0]
+        regular = ~converged & (np.abs(det) > 1e-300)
+        det = np.where(regular, det, 1.)
+        d_a = (J[..., 0, 1] * G_i - J[..., 1, 1] * G_a) / det
+        d_i = (J[..., 1, 0] * G_a - J[..., 0, 0] * G_i) / det
+        rho_a = np.clip(rho_a + np.where(regular, d_a, 0.), 0., 1.)
+        rho_i = np.clip(rho_i + np.where(regular, d_i, 0.), 0., 1. - rho_a)
+    return rho_a, rho_i, converged
+
+
+def spectral_radius(rho_a, rho_i, alpha, n_neighbors=8,
+                    damping=0) -> np.ndarray:
+    """
+    Largest absolute eigenvalue of the Jacobian of mf_step at (rho_a, rho_i).
+    A fixed point is linearly stable if it is below 1.
+    """
+    J = mf_jacobian(rho_a, rho_i, alpha, n_neighbors, damping)
+    return np.abs(np.linalg.eigvals(J)).max(axis=-1)
+
+
+def continue_fixed_points(alphas, init_alive, init_spore, n_neighbors=8,
+                          damping=0, **kwargs) -> dict:
+    """
+    Track the fixed points of mf_step along the sequence alphas by natural
+    parameter continuation: the fixed point at each alpha is found with
+    find_fixed_points, starting from a secant prediction from the fixed points
+    at the previous two alphas, and the first one from init_alive and
+    init_spore, which may be arrays to track several branches at once.
+    Returns the arrays "alive", "spore", "converged" and "stable" of shape
+    (len(alphas), *shape). A branch that stops converging, e.g. beyond a
+    fold, has lost its fixed point.
+    """
+    alphas = np.asarray(alphas, dtype=float)
+    rho_a, rho_i = init_alive, init_spore
+    branches = {key: [] for key in ("alive", "spore", "converged", "stable")}
+    for k, alpha in enumerate(alphas):
+        if k >= 2:
+            # Secant predictor, following the branch through its curvature
+            w = (alpha - alphas[k-1]) / (alphas[k-1] - alphas[k-2])
+            rho_a = np.clip(rho_a + w * (rho_a - branches["alive"][-2]), 0, 1)
+            rho_i = np.clip(rho_i + w * (rho_i - branches["spore"][-2]),
+                            0, 1 - rho_a)
+        rho_a, rho_i, converged = find_fixed_points(
+            rho_a, rho_i, alpha, n_neighbors, damping, **kwargs)
+        branches["alive"].append(rho_a)
+        branches["spore"].append(rho_i)
+        branches["converged"].append(converged)
+        branches["stable"].append(
+            converged & (spectral_radius(rho_a, rho_i, alpha, n_neighbors,
+                                         damping) < 1))
+    return {key: np.array(value) for key, value in branches.items()}
+
+
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
     rhoLife  = 0.35 + 0.1*random.uniform(0,1)
     # rhoSpore = random.uniform(0,1)*(1.0-rhoLife)
     rhoSpore = 1.0 - rhoLife
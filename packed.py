@@ -0,0 +1,320 @@
+# Bit-packed Game of Life and SporeLife
+import numpy as np
+from gol import CellularAutomaton, GameOfLife, SporeLife, random_subset
+from gol import DEAD, ALIVE, SPORE
+
+
+def pack_plane(plane: np.ndarray) -> np.ndarray:
+    """
+    Pack a boolean N x N plane into an N x W array of uint64 words with
+    W = ceil(N / 64). Column j of a row is bit j % 64 of word j // 64, unused
+    bits of the last word are zero.
+    """
+    n_rows, n_cols = plane.shape
+    n_words = -(-n_cols // 64)
+    packed = np.zeros((n_rows, n_words * 8), dtype=np.uint8)
+    packed[:, :-(-n_cols // 8)] = np.packbits(plane, axis=1, bitorder="little")
+    return packed.view("<u8")
+
+
+def unpack_plane(words: np.ndarray, n_cols: int) -> np.ndarray:
+    """
+    Unpack an N x W array of uint64 words into a boolean plane with n_cols
+    columns, inverse of pack_plane.
+    """
+    bits = np.unpackbits(words.view(np.uint8), axis=1, count=n_cols,
+                         bitorder="little")
+    return bits.view(np.bool_)
+
+
+def popcount(words: np.ndarray) -> int:
+    """
+    Number of set bits in words.
+    """
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(words).sum())
+    return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+_ONE = np.uint64(1)
+_LAST = np.uint64(63)
+
+
+def _column_mask(n_cols: int) -> np.ndarray:
+    """
+    Mask of the bits of a row of words that belong to the n_cols columns.
+    """
+    return pack_plane(np.ones((1, n_cols), dtype=np.bool_))[0]
+
+
+def _shift_west(x: np.ndarray, n_cols: int, periodic: bool) -> np.ndarray:
+    """
+    Move each cell one column to the right, i.e. the returned plane holds the
+    western neighbor (column j-1) of each cell (i, j).
+    """
+    y = x << _ONE
+    y[:, 1:] |= x[:, :-1] >> _LAST
+    if periodic:
+        y[:, 0] |= (x[:, -1] >> np.uint64((n_cols - 1) % 64)) & _ONE
+    return y
+
+
+def _shift_east(x: np.ndarray, n_cols: int, periodic: bool) -> np.ndarray:
+    """
+    Move each cell one column to the left, i.e. the returned plane holds the
+    eastern neighbor (column j+1) of each cell (i, j).
+    """
+    y = x >> _ONE
+    y[:, :-1] |= x[:, 1:] << _LAST
+    if periodic:
+        y[:, -1] |= (x[:, 0] & _ONE) << np.uint64((n_cols - 1) % 64)
+    return y
+
+
+def _shift_rows(x: np.ndarray, shift: int, periodic: bool) -> np.ndarray:
+    """
+    Move each row by shift rows (+1: down, -1: up), filling with empty rows
+    if the boundary is not periodic.
+    """
+    if periodic:
+        return np.roll(x, shift, axis=0)
+    y = np.zeros_like(x)
+    if shift > 0:
+        y[shift:] = x[:-shift]
+    else:
+        y[:shift] = x[-shift:]
+    return y
+
+
+def neighbor_count_planes(x: np.ndarray, n_cols: int,
+                          periodic: bool) -> tuple[np.ndarray]:
+    """
+    Count the set 8-neighbors of each cell of the packed plane x with a
+    bit-sliced adder. Returns the four bit planes (s0, s1, s2, s3) of the count,
+    i.e. count = s0 + 2 s1 + 4 s2 + 8 s3.
+    """
+    west = _shift_west(x, n_cols, periodic)
+    east = _shift_east(x, n_cols, periodic)
+    # Three cells in a row: the cell itself and its western / eastern neighbor
+    row_cells = (west, x, east)
+    neighbors = [_shift_rows(r, 1, periodic) for r in row_cells]
+    neighbors += [_shift_rows(r, -1, periodic) for r in row_cells]
+    neighbors += [west, east]
+    s0, s1, s2, s3 = (np.zeros_like(x) for _ in range(4))
+    for b in neighbors:
+        c0 = s0 & b
+        s0 ^= b
+        c1 = s1 & c0
+        s1 ^= c0
+        c2 = s2 & c1
+        s2 ^= c1
+        s3 |= c2
+    return s0, s1, s2, s3
+
+
+def neighbor_count_masks(x: np.ndarray, n_cols: int,
+                         periodic: bool) -> dict:
+    """
+    Packed masks of the cells with 1, 3, 4 and 2 or 3 set neighbors in the
+    packed plane x.
+    """
+    s0, s1, s2, s3 = neighbor_count_planes(x, n_cols, periodic)
+    low = ~s3 & ~s2 # count < 4
+    return {
+        1: low & ~s1 & s0,
+        3: low & s1 & s0,
+        4: ~s3 & s2 & ~s1 & ~s0,
+        (2, 3): low & s1,
+    }
+
+
+class _PackedMixin():
+    """
+    Storage of the grid as packed ALIVE and SPORE bit planes, see pack_plane.
+    The grid and the ALIVE neighbor counts are unpacked on demand.
+    """
+    @property
+    def grid(self) -> np.ndarray:
+        return self._unpack(self.alive_plane, self.spore_plane)
+
+    @grid.setter
+    def grid(self, grid: np.ndarray):
+        self.n_cols = grid.shape[1]
+        self.col_mask = _column_mask(self.n_cols)
+        self.alive_plane = pack_plane(grid == ALIVE)
+        self.spore_plane = pack_plane(grid == SPORE)
+
+    @property
+    def life_neighborhood_grid(self) -> np.ndarray:
+        s0, s1, s2, s3 = neighbor_count_planes(
+            self.alive_plane, self.n_cols, self.periodic_boundary)
+        c = np.zeros((self.N, self.n_cols), dtype=self.count_dtype)
+        for k, s in enumerate((s0, s1, s2, s3)):
+            c |= unpack_plane(s, self.n_cols).astype(self.count_dtype) << k
+        return c
+
+    def count_state(self, state: int) -> int:
+        n_alive, n_spore = popcount(self.alive_plane), popcount(self.spore_plane)
+        if state == ALIVE:
+            return n_alive
+        if state == SPORE:
+            return n_spore
+        if state == DEAD:
+            return self.N * self.n_cols - n_alive - n_spore
+        return 0
+
+    def _random_subset(self, candidates: np.ndarray, p: float) -> np.ndarray:
+        """
+        Packed mask selecting each cell in the packed mask candidates
+        independently with probability p. Random numbers are only drawn for the
+        candidates, see random_subset.
+        """
+        plane = unpack_plane(candidates, self.n_cols)
+        idx = np.flatnonzero(plane)
+        plane[...] = False
+        plane.flat[random_subset(self.rng, idx, p)] = True
+        return pack_plane(plane)
+
+    def _scramble_planes(self, alive_plane, spore_plane):
+        grid = self.scramble(self._unpack(alive_plane, spore_plane))
+        return pack_plane(grid == ALIVE), pack_plane(grid == SPORE)
+
+    def _unpack(self, alive_plane, spore_plane) -> np.ndarray:
+        grid = unpack_plane(alive_plane, self.n_cols).astype(np.uint8)
+        grid[unpack_plane(spore_plane, self.n_cols)] = SPORE
+        return grid
+
+    def set_state(self, state: dict):
+        self.grid = state["grid"]
+        self.t = state["t"]
+        self.rng.bit_generator.state = state["rng"]
+
+    def add_observer(self, observer):
+        raise NotImplementedError("Observers need the unpacked grids of every step!")
+
+    def step(self, silent: bool = False, **kwargs) -> np.ndarray:
+        """
+        Perform a step and return the unpacked new grid, see step_planes for
+        the arguments.
+        """
+        alive_plane, spore_plane = self.step_planes(silent=silent, **kwargs)
+        return self._unpack(alive_plane, spore_plane)
+
+    def step_until(self, t: int, **kwargs) -> np.ndarray:
+        assert self.t <= t
+        while self.t < t:
+            self.step_planes(**kwargs)
+        return self.grid
+
+
+class PackedGameOfLife(_PackedMixin, GameOfLife):
+    """
+    Game of Life on a grid stored as a packed ALIVE bit plane. Neighbors are
+    counted with a bit-sliced adder on 64 cells at a time. Stochastic births are
+    equal in distribution but not in random stream to GameOfLife.
+    """
+    def __init__(self, init_grid: np.ndarray, seed: int = None,
+                 periodic_boundary: bool = True):
+        self.states = np.array([DEAD, ALIVE], dtype=self.grid_dtype)
+        CellularAutomaton.__init__(self, init_grid, self.states, seed,
+                                   periodic_boundary)
+
+    def reinit_grid(self, p_alive):
+        assert 0 <= p_alive <= 1
+        p_dead = 1 - p_alive
+        dims = (self.N, self.N)
+        self.grid = self.rng.choice(self.states, p=(p_dead, p_alive), size=dims)
+
+    def step_planes(self, silent: bool = False, scramble: bool = False,
+                    overcrowd_birth_p: float = None) -> tuple[np.ndarray]:
+        """
+        Perform a step in Game of Life and return the new packed ALIVE and
+        SPORE planes.
+        A silent step is only computed and returned but does not count as a time
+        step and is not stored.
+        """
+        A = self.alive_plane
+        c = neighbor_count_masks(A, self.n_cols, self.periodic_boundary)
+        # Survive with 2 or 3, birth with 3 ALIVE neighbors
+        nA = (A & c[(2, 3)]) | (~A & c[3])
+        # Birth with 4 ALIVE neighbors with probability overcrowd_birth_p
+        if overcrowd_birth_p is not None:
+            nA |= self._random_subset(~A & c[4] & self.col_mask,
+                                      overcrowd_birth_p)
+        nA &= self.col_mask
+        nS = np.zeros_like(nA)
+        if scramble:
+            nA, nS = self._scramble_planes(nA, nS)
+        if not silent:
+            self.alive_plane, self.spore_plane = nA, nS
+            self.t += 1
+        return nA, nS
+
+
+class PackedSporeLife(_PackedMixin, SporeLife):
+    """
+    SporeLife on a grid stored as packed ALIVE and SPORE bit planes. Neighbors
+    are counted with a bit-sliced adder on 64 cells at a time. Deterministic
+    steps are identical to SporeLife, stochastic steps are equal in distribution
+    but not in random stream.
+    """
+    def __init__(self, init_grid: np.ndarray, alpha: float = 1,
+                 seed: int = None, periodic_boundary: bool = True):
+        self.states = np.array([DEAD, ALIVE, SPORE], dtype=self.grid_dtype)
+        CellularAutomaton.__init__(self, init_grid, self.states, seed,
+                                   periodic_boundary)
+        assert 0 <= alpha <= 1
+        self.alpha = alpha
+
+    def reinit_grid(self, p_alive: float, p_dorm: float):
+        assert 0 <= p_alive <= 1 and 0 <= p_dorm <= 1 and p_alive + p_dorm < 1
+        p_dead = 1 - p_alive - p_dorm
+        dims = (self.N, self.N)
+        prob = (p_dead, p_alive, p_dorm)
+        self.grid = self.rng.choice(self.states, p=prob, size=dims)
+
+    def deterministic_step(self, silent: bool = False,
+                           **kwargs) -> np.ndarray:
+        alive_plane, spore_plane = self.step_planes(silent=silent, alpha=1,
+                                                    **kwargs)
+        return self._unpack(alive_plane, spore_plane)
+
+    def step_planes(self, silent: bool = False,
+                    overcrowd_dormancy: bool = False,
+                    scramble: bool = False,
+                    overcrowd_birth_p: float = None,
+                    alpha: float = None) -> tuple[np.ndarray]:
+        """
+        Perform a (possibly stochastic) step in SporeLife and return the new
+        packed ALIVE and SPORE planes. If given, alpha overrides the alpha of
+        the instance.
+        A silent step is only computed and returned but does not count as a time
+        step and is not stored.
+        If overcrowd_dormancy is true, an ALIVE cell with 4 ALIVE neighbors goes
+        dormant, else it just dies.
+        """
+        alpha = self.alpha if alpha is None else alpha
+        A, S = self.alive_plane, self.spore_plane
+        D = ~(A | S) & self.col_mask
+        c = neighbor_count_masks(A, self.n_cols, self.periodic_boundary)
+        # Birth with 4 ALIVE neighbors with probability overcrowd_birth_p
+        if overcrowd_birth_p is not None:
+            birth = self._random_subset((D | S) & c[4], overcrowd_birth_p)
+        else:
+            birth = np.zeros_like(A)
+        # ALIVE stays, DORMANT and DEAD awake
+        nA = ((A | S) & c[(2, 3)]) | (D & c[3]) | birth
+        # ALIVE goes DORMANT, DORMANT stays
+        dormant = c[1] | c[4] if overcrowd_dormancy else c[1]
+        nS = (A & dormant) | (S & ~c[(2, 3)] & ~birth)
+        if scramble:
+            nA, nS = self._scramble_planes(nA, nS)
+        # Randomly kill SPOREs based on alpha
+        if alpha == 0:
+            nS = np.zeros_like(nS)
+        elif alpha < 1:
+            nS &= ~self._random_subset(nS, 1 - alpha)
+        if not silent:
+            self.alive_plane, self.spore_plane = nA, nS
+            self.t += 1
+        return nA, nS
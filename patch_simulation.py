@@ -8,8 +8,8 @@ from util import random_patch
 if __name__ == "__main__":
     init_grid = random_patch(30, 7, (10, 15), seed=100)
     # init_grid = random_init_grid(30, q=0.17)
-    gol = GameOfLife(init_grid)
-    dl = SporeLife(init_grid, alpha=1)
+    gol = GameOfLife(init_grid, active_region=True)
+    dl = SporeLife(init_grid, alpha=1, active_region=True)
     colors = ["white", "tab:orange", "tab:blue"]
     cmap = ListedColormap(colors)
     fig, ax = plt.subplots(figsize=(7.2, 3.2), ncols=2)
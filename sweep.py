@@ -0,0 +1,239 @@
+import os
+import json
+import multiprocessing
+import numpy as np
+from util import Profiler, atomic_write, load_results, run_seeds, save_results
+
+
+class Checkpoint():
+    """
+    Checkpoint of an unfinished sweep unit at path: the state of an automaton,
+    see CellularAutomaton.get_state, and extra JSON serializable values of the
+    computation stepping it.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        # Directory of the unit, for units that write further files
+        self.directory = os.path.dirname(path)
+
+    def save(self, ca, **extra):
+        """
+        Save the state of ca and the values extra, atomically replacing an
+        older checkpoint.
+        """
+        state = ca.get_state()
+        meta = {key: value for key, value in state.items() if key != "grid"}
+        meta["extra"] = extra
+        os.makedirs(self.directory, exist_ok=True)
+        with atomic_write(self.path) as f:
+            np.savez_compressed(f, grid=state["grid"],
+                                meta=np.array(json.dumps(meta)))
+
+    def restore(self, ca) -> dict:
+        """
+        Restore ca from the checkpoint and return the extra values saved with
+        it, or return None if there is no checkpoint.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with np.load(self.path) as npz:
+            grid = npz["grid"]
+            meta = json.loads(npz["meta"].item())
+        extra = meta.pop("extra")
+        ca.set_state(dict(meta, grid=grid))
+        return extra
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Sweep():
+    """
+    Persistent sweep over the parameter values alphas with runs runs each,
+    split into units (alpha, chunk) of chunk_size consecutive runs. The result
+    of every finished unit is stored in base_path/sweep, so that running an
+    interrupted sweep again only computes the missing units, resuming units
+    from their checkpoints.
+    Every run draws from its own random streams derived from the root seed,
+    see util.run_seeds. Without a seed, fresh entropy is drawn once and stored
+    with the sweep, so that resumed units continue with the same streams.
+    """
+    def __init__(self, base_path: str, alphas, runs: int,
+                 chunk_size: int = 1, seed: int = None):
+        assert runs > 0 and chunk_size > 0
+        self.path = os.path.join(base_path, "sweep")
+        self.alphas = list(alphas)
+        self.runs = runs
+        self.chunk_size = chunk_size
+        self.n_chunks = -(-runs // chunk_size)
+        self.seed = self._load_seed(seed)
+
+    def _load_seed(self, seed: int) -> int:
+        """
+        Root seed of the sweep, stored in the sweep directory.
+        """
+        path = os.path.join(self.path, "seed.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                stored_seed = json.load(f)["seed"]
+            if seed is not None and seed != stored_seed:
+                raise ValueError(f"{self.path} belongs to a sweep with seed "
+                                 f"{stored_seed}, not {seed}")
+            return stored_seed
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        os.makedirs(self.path, exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(json.dumps({"seed": int(seed)}).encode())
+        return int(seed)
+
+    def seeds(self, alpha: float, chunk: int) -> list[tuple]:
+        """
+        Seed sequences (grid_seed, step_seed) of every run of the unit.
+        """
+        return [run_seeds(self.seed, alpha, run)
+                for run in self.chunk_runs(chunk)]
+
+    def chunk_runs(self, chunk: int) -> range:
+        """
+        Indices of the runs of chunk.
+        """
+        return range(chunk * self.chunk_size,
+                     min((chunk + 1) * self.chunk_size, self.runs))
+
+    def units(self) -> list[tuple]:
+        return [(alpha, chunk) for alpha in self.alphas
+                for chunk in range(self.n_chunks)]
+
+    def unit_path(self, alpha: float, chunk: int, name: str = "result.npz"):
+        """
+        Path of the file name belonging to the unit (alpha, chunk).
+        """
+        return os.path.join(self.path, "alpha-%.3f"%alpha,
+                            f"chunk-{chunk}", name)
+
+    def checkpoint(self, alpha: float, chunk: int) -> Checkpoint:
+        return Checkpoint(self.unit_path(alpha, chunk, "checkpoint.npz"))
+
+    def done(self, alpha: float, chunk: int) -> bool:
+        return os.path.exists(self.unit_path(alpha, chunk))
+
+    def pending(self) -> list[tuple]:
+        return [unit for unit in self.units() if not self.done(*unit)]
+
+    def save(self, alpha: float, chunk: int, result: np.ndarray):
+        """
+        Store the result of the unit (alpha, chunk), marking it as done. The
+        result may be None for units that wrote their output to files.
+        """
+        path = self.unit_path(alpha, chunk)
+        if result is None:
+            result = np.zeros(0)
+        save_results(result, base_path=os.path.dirname(path),
+                     prefix=os.path.splitext(os.path.basename(path))[0],
+                     metadata={"alpha": alpha, "chunk": chunk},
+                     overwrite="overwrite")
+        self.checkpoint(alpha, chunk).clear()
+
+    def results(self, alpha: float) -> np.ndarray:
+        """
+        Results of all chunks of alpha concatenated along the first axis.
+        """
+        return np.concatenate([load_results(self.unit_path(alpha, chunk))
+                               for chunk in range(self.n_chunks)])
+
+    def save_profile(self, alpha: float, chunk: int, profiler: Profiler):
+        path = self.unit_path(alpha, chunk, "profile.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(json.dumps(profiler.to_dict()).encode())
+
+    def profile(self, alpha: float) -> Profiler:
+        """
+        Profiles of the chunks of alpha merged into one, see run. Chunks
+        computed without profiling are left out.
+        """
+        profiler = Profiler()
+        for chunk in range(self.n_chunks):
+            path = self.unit_path(alpha, chunk, "profile.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    profiler.merge(Profiler.from_dict(json.load(f)))
+        return profiler
+
+    def print_profiles(self):
+        """
+        Print the breakdown of the time of the profiled units per alpha.
+        """
+        for alpha in self.alphas:
+            profiler = self.profile(alpha)
+            if profiler.timers:
+                print(profiler.report(title="alpha = %.3f"%alpha) + "\n")
+
+    def run(self, unit, cost=None, merge=None, processes: int = None,
+            profile: bool = False):
+        """
+        Compute all pending units in a pool of processes. unit is called as
+            unit(alpha, runs, seeds, checkpoint)
+        for the range of runs of the chunk, the seeds of these runs and the
+        Checkpoint of the unit, and returns an array whose first axis is
+        concatenated over the chunks by results, e.g. with one entry per run.
+        The checkpoint belongs to the unit, units of several runs have to keep
+        track of the run themselves. unit has to be picklable, i.e. a module
+        level function.
+        Units are scheduled one at a time in the order of decreasing expected
+        cost(alpha, runs), by default the number of runs, so that long units
+        do not start last and leave the other processes idle. As soon as all
+        units of an alpha are done, merge(alpha) is called in this process,
+        e.g. to save sweep.results(alpha), which does not depend on the order
+        in which the units finished. The pool has one process per available
+        core unless processes is given.
+        If profile is true, unit is called with the additional keyword argument
+        profiler, a util.Profiler to time the phases of the unit with, e.g. as
+        the profiler of its automata. The profile of every unit is stored with
+        its result, see profile.
+        """
+        if cost is None:
+            cost = lambda alpha, runs: len(runs)
+        pending = sorted(
+            self.pending(), reverse=True,
+            key=lambda task: cost(task[0], self.chunk_runs(task[1])))
+        remaining = {alpha: 0 for alpha in self.alphas}
+        for alpha, _ in pending:
+            remaining[alpha] += 1
+        if merge is not None:
+            for alpha in self.alphas:
+                if remaining[alpha] == 0:
+                    merge(alpha)
+        if not pending:
+            return
+        if processes is None:
+            processes = min(available_cores(), len(pending))
+        tasks = [(self, unit, alpha, chunk, profile)
+                 for alpha, chunk in pending]
+        with multiprocessing.Pool(processes=processes) as pool:
+            for alpha in pool.imap_unordered(_run_unit, tasks, chunksize=1):
+                remaining[alpha] -= 1
+                if merge is not None and remaining[alpha] == 0:
+                    merge(alpha)
+
+
+def available_cores() -> int:
+    """
+    Number of cores this process may run on.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _run_unit(task):
+    sweep, unit, alpha, chunk, profile = task
+    kwargs = {"profiler": Profiler()} if profile else {}
+    result = unit(alpha, sweep.chunk_runs(chunk), sweep.seeds(alpha, chunk),
+                  sweep.checkpoint(alpha, chunk), **kwargs)
+    if profile:
+        sweep.save_profile(alpha, chunk, kwargs["profiler"])
+    sweep.save(alpha, chunk, result)
+    return alpha
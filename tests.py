@@ -1,7 +1,34 @@
+import itertools
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import tracemalloc
 import unittest
+from unittest import mock
 import numpy as np
-from gol import CellularAutomaton, SporeLife
+from scipy.stats import binom
+from gol import CellularAutomaton, GameOfLife, SporeLife, SporeLifeEnsemble
 from gol import ALIVE, SPORE, DEAD
+from gol import GAME_OF_LIFE_TABLE, SPORE_LIFE_TABLE
+from gol import fused_step, random_subset
+from hashlife import HashGameOfLife, HashSporeLife
+from mean_field import BatchMFSporeLife, MFSporeLife
+from mean_field import continue_fixed_points, find_fixed_points, mf_jacobian
+from mean_field import PairSporeLife, mf_step, spectral_radius
+from packed import PackedGameOfLife, PackedSporeLife
+from packed import pack_plane, unpack_plane, popcount
+from transitions import count_transitions, count_transitions_ensemble
+from benchmark import legacy_count_transitions
+from benchmark import STEP_CASES, HELPER_CASES, compare_suites, load_suite
+from benchmark import run_suite, save_suite
+from extinction_time import extinction_time_stastistics, find_extinction_time
+from sweep import Checkpoint, Sweep
+from time_series import ensemble_time_series, stream_time_series
+from util import NpyWriter, Profiler, Timer
+from util import random_init_grid, random_patch
+from util import load_results, save_data, save_results
 
 
 class TestCellularAutomaton(unittest.TestCase):
@@ -28,13 +55,15 @@ class TestSporeLifeRules(unittest.TestCase):
     """
     Testing the step function for SporeLife, i.e. the rules of SporeLife.
     """
+    engine = "mask"
+
     def test_DEAD_awake_rule(self):
         test_grid = np.array([
             [DEAD, DEAD, DEAD],
             [DEAD, DEAD, ALIVE],
             [DEAD, ALIVE, ALIVE]
         ])
-        sl = SporeLife(test_grid, periodic_boundary=False)
+        sl = SporeLife(test_grid, periodic_boundary=False, engine=self.engine)
         grid_step = sl.step()
         res = np.array([
             [DEAD, DEAD, DEAD],
@@ -49,7 +78,7 @@ class TestSporeLifeRules(unittest.TestCase):
             [DEAD, SPORE, ALIVE], # SPORE with 3 ALIVE neighbors
             [DEAD, ALIVE, DEAD]
         ])
-        sl = SporeLife(test_grid, periodic_boundary=False)
+        sl = SporeLife(test_grid, periodic_boundary=False, engine=self.engine)
         grid_step = sl.step()
         res = np.array([
             [DEAD, SPORE, ALIVE],
@@ -65,7 +94,7 @@ class TestSporeLifeRules(unittest.TestCase):
             [DEAD, DEAD, ALIVE, ALIVE], # At 2, 2 and 2, 3 ALIVE cell with 4 ALIVE neighbors
             [DEAD, DEAD, ALIVE, ALIVE]
         ])
-        sl = SporeLife(test_grid, periodic_boundary=False)
+        sl = SporeLife(test_grid, periodic_boundary=False, engine=self.engine)
         grid_step = sl.step()
         res = np.array([
             [DEAD, DEAD, DEAD, DEAD],
@@ -81,7 +110,7 @@ class TestSporeLifeRules(unittest.TestCase):
             [DEAD, ALIVE, DEAD],
             [DEAD, DEAD, DEAD]
         ])
-        sl = SporeLife(test_grid, periodic_boundary=False)
+        sl = SporeLife(test_grid, periodic_boundary=False, engine=self.engine)
         grid_step = sl.step()
         res = np.array([
             [DEAD, SPORE, DEAD],
@@ -96,7 +125,7 @@ class TestSporeLifeRules(unittest.TestCase):
             [DEAD, DEAD, ALIVE],
             [DEAD, ALIVE, ALIVE]
         ])
-        sl = SporeLife(test_grid, periodic_boundary=True)
+        sl = SporeLife(test_grid, periodic_boundary=True, engine=self.engine)
         grid_step = sl.step()
         np.testing.assert_array_equal(grid_step, np.full((3, 3), ALIVE))
     
@@ -106,7 +135,7 @@ class TestSporeLifeRules(unittest.TestCase):
             [DEAD, DEAD, ALIVE],
             [DEAD, ALIVE, ALIVE]
         ])
-        sl = SporeLife(test_grid, periodic_boundary=False)
+        sl = SporeLife(test_grid, periodic_boundary=False, engine=self.engine)
         silent_step = sl.step(silent=True)
         res = np.array([
             [DEAD, DEAD, DEAD],
@@ -128,19 +157,21 @@ class TestSporeLifeRules(unittest.TestCase):
             [DEAD, ALIVE, SPORE],
             [DEAD, SPORE, ALIVE]
         ])
-        sl = SporeLife(test_grid, periodic_boundary=False)
+        sl = SporeLife(test_grid, periodic_boundary=False, engine=self.engine)
         np.testing.assert_array_equal(sl.step(), res)
         np.testing.assert_array_equal(sl.step(), test_grid)
 
 
 class TestSporeLifeStochasticity(unittest.TestCase):
+    engine = "mask"
+
     def test_game_of_life_limit(self):
         test_grid = np.array([
             [DEAD, ALIVE, DEAD],
             [DEAD, ALIVE, DEAD],
             [DEAD, DEAD, DEAD]
         ])
-        sl = SporeLife(test_grid, alpha=0, periodic_boundary=False)
+        sl = SporeLife(test_grid, alpha=0, periodic_boundary=False, engine=self.engine)
         grid_step = sl.step()
         np.testing.assert_array_equal(grid_step, np.full((3, 3), DEAD))
     
@@ -150,7 +181,7 @@ class TestSporeLifeStochasticity(unittest.TestCase):
             [DEAD, ALIVE, DEAD],
             [SPORE, SPORE, SPORE]
         ])
-        sl = SporeLife(test_grid, alpha=.3, periodic_boundary=False, seed=100)
+        sl = SporeLife(test_grid, alpha=.3, periodic_boundary=False, seed=100, engine=self.engine)
         """
         decision_grid = [
             [0.83498163, 0.59655403, 0.28886324],
@@ -166,6 +197,953 @@ class TestSporeLifeStochasticity(unittest.TestCase):
         ])
         np.testing.assert_array_equal(grid_step, res)
     
+
+class TestSporeLifeRulesTable(TestSporeLifeRules):
+    engine = "table"
+
+
+class TestSporeLifeStochasticityTable(TestSporeLifeStochasticity):
+    engine = "table"
+
+
+class NumbaEngineTestCase(unittest.TestCase):
+    """
+    Runs the numba engine with the uncompiled fused_step, so that it is tested
+    without numba being installed.
+    """
+    def setUp(self):
+        patcher = mock.patch("gol.fused_step_kernel", return_value=fused_step)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TestSporeLifeRulesNumba(NumbaEngineTestCase, TestSporeLifeRules):
+    engine = "numba"
+
+
+class TestNumbaEngine(NumbaEngineTestCase):
+    def test_deterministic_equivalence(self):
+        for periodic_boundary in (True, False):
+            init_grid = random_init_grid(12, seed=1)
+            for cls, kwargs in ((GameOfLife, {}), (SporeLife, {"alpha": 1}),
+                                (SporeLife, {"alpha": 0})):
+                ca = cls(init_grid, periodic_boundary=periodic_boundary,
+                         engine="numba", **kwargs)
+                ca_table = cls(init_grid, periodic_boundary=periodic_boundary,
+                               engine="table", **kwargs)
+                for _ in range(5):
+                    np.testing.assert_array_equal(ca.step(), ca_table.step())
+                self.assertEqual(ca.alive_count, ca_table.alive_count)
+                np.testing.assert_array_equal(ca.life_neighborhood_grid,
+                                              ca_table.life_neighborhood_grid)
+
+    def test_spore_decay(self):
+        # All cells are isolated SPOREs, which die with probability 1 - alpha
+        sl = SporeLife(np.full((40, 40), SPORE), alpha=0.25, seed=1,
+                       engine="numba")
+        sl.step()
+        self.assertEqual(sl.spore_count, np.count_nonzero(sl.grid == SPORE))
+        self.assertAlmostEqual(sl.spore_count / 40**2, 0.25, delta=0.05)
+
+    def test_fallback(self):
+        with mock.patch("gol.fused_step_kernel", return_value=None):
+            with self.assertWarns(UserWarning):
+                sl = SporeLife(random_init_grid(5, seed=1), engine="numba")
+        self.assertEqual(sl.engine, "table")
+
+
+class TestStripedSteps(unittest.TestCase):
+    def test_deterministic_equivalence(self):
+        for periodic_boundary in (True, False):
+            # 3 stripes of unequal height
+            init_grid = random_init_grid(17, seed=1)
+            for cls, kwargs in ((GameOfLife, {}), (SporeLife, {"alpha": 1})):
+                ca = cls(init_grid, periodic_boundary=periodic_boundary,
+                         engine="table", **kwargs)
+                ca_striped = cls(init_grid, periodic_boundary=periodic_boundary,
+                                 engine="table", threads=3, **kwargs)
+                for _ in range(20):
+                    np.testing.assert_array_equal(ca.step(), ca_striped.step())
+                np.testing.assert_array_equal(
+                    ca.life_neighborhood_grid,
+                    ca_striped.life_neighborhood_grid)
+
+    def test_stochastic_state(self):
+        init_grid = random_init_grid(20, seed=1)
+        kwargs = {"alpha": 0.5, "seed": 2, "threads": 4}
+        sl = SporeLife(init_grid, **kwargs)
+        for _ in range(5):
+            sl.step(overcrowd_birth_p=0.5)
+        sl_restored = SporeLife(init_grid, **kwargs)
+        sl_restored.set_state(sl.get_state())
+        for _ in range(5):
+            np.testing.assert_array_equal(
+                sl.step(overcrowd_birth_p=0.5),
+                sl_restored.step(overcrowd_birth_p=0.5))
+
+    def test_spore_decay(self):
+        # All cells are isolated SPOREs, which die with probability 1 - alpha
+        sl = SporeLife(np.full((40, 40), SPORE), alpha=0.25, seed=1, threads=4)
+        sl.step()
+        self.assertAlmostEqual(sl.spore_count / 40**2, 0.25, delta=0.05)
+
+    def test_close(self):
+        init_grid = random_init_grid(20, seed=1)
+        with SporeLife(init_grid, alpha=1, threads=2) as sl:
+            sl.step()
+            executor = sl._executor
+            copy = sl.detached_copy()
+            copy.step()
+            # The copy starts its own threads
+            self.assertIsNot(copy._executor, executor)
+            copy.close()
+        self.assertIsNone(sl._executor)
+        self.assertTrue(executor._shutdown)
+        # Closed automata start new threads when stepped again
+        sl.step()
+        self.assertIsNotNone(sl._executor)
+        sl.close()
+
+
+class TestSparseSampling(unittest.TestCase):
+    def test_random_subset(self):
+        rng = np.random.default_rng(1)
+        state = rng.bit_generator.state
+        candidates = np.arange(10_000)
+        self.assertEqual(random_subset(rng, candidates, 0).size, 0)
+        self.assertEqual(random_subset(rng, candidates[:0], 0.5).size, 0)
+        np.testing.assert_array_equal(random_subset(rng, candidates, 1),
+                                      candidates)
+        # No random numbers drawn in the trivial cases
+        self.assertEqual(rng.bit_generator.state, state)
+        subset = random_subset(rng, candidates, 0.3)
+        self.assertEqual(np.unique(subset).size, subset.size)
+        self.assertAlmostEqual(subset.size / candidates.size, 0.3, delta=0.02)
+
+    def test_no_draws(self):
+        # No SPORE can die for alpha = 1 and no SPOREs exist in Game of Life
+        for alpha, init_grid in ((1, random_init_grid(20, seed=1)),
+                                 (0.5, np.full((20, 20), DEAD))):
+            sl = SporeLife(init_grid, alpha=alpha, seed=2, sampling="sparse")
+            state = sl.rng.bit_generator.state
+            sl.step()
+            self.assertEqual(sl.rng.bit_generator.state, state)
+
+    def test_engines(self):
+        init_grid = random_init_grid(20, seed=1)
+        for kwargs in ({"overcrowd_birth_p": 0.5}, {"scramble": True}):
+            sl_mask = SporeLife(init_grid, alpha=0.5, seed=2,
+                                sampling="sparse")
+            sl_table = SporeLife(init_grid, alpha=0.5, seed=2, engine="table",
+                                 sampling="sparse")
+            for _ in range(20):
+                np.testing.assert_array_equal(sl_mask.step(**kwargs),
+                                              sl_table.step(**kwargs))
+
+    def test_spore_decay(self):
+        sl = SporeLife(np.full((40, 40), SPORE), alpha=0.25, seed=1,
+                       sampling="sparse")
+        sl.step()
+        self.assertAlmostEqual(sl.spore_count / 40**2, 0.25, delta=0.05)
+
+
+class TestBufferedSteps(unittest.TestCase):
+    def test_equivalence(self):
+        init_grid = random_init_grid(20, seed=1)
+        for kwargs, sampling, incremental in itertools.product(
+                ({}, {"overcrowd_birth_p": 0.5}, {"scramble": True}),
+                ("full", "sparse"), (False, True)):
+            sl = SporeLife(init_grid, alpha=0.5, seed=2, engine="table",
+                           sampling=sampling, incremental=incremental)
+            sl_buffered = SporeLife(init_grid, alpha=0.5, seed=2,
+                                    engine="table", sampling=sampling,
+                                    incremental=incremental, buffered=True)
+            for _ in range(20):
+                np.testing.assert_array_equal(sl.step(**kwargs),
+                                              sl_buffered.step(**kwargs))
+                np.testing.assert_array_equal(
+                    sl.life_neighborhood_grid,
+                    sl_buffered.life_neighborhood_grid)
+        gol = GameOfLife(init_grid % 2, seed=2, engine="table")
+        gol_buffered = GameOfLife(init_grid % 2, seed=2, engine="table",
+                                  buffered=True)
+        for _ in range(20):
+            np.testing.assert_array_equal(
+                gol.step(overcrowd_birth_p=0.5),
+                gol_buffered.step(overcrowd_birth_p=0.5))
+
+    def test_view_contract(self):
+        sl = SporeLife(random_init_grid(20, seed=1), alpha=0.5,
+                       engine="table", buffered=True)
+        grid = sl.step()
+        self.assertIs(grid, sl.grid)
+        silent_grid = sl.step(silent=True)
+        self.assertIsNot(silent_grid, grid)
+        self.assertEqual(sl.t, 1)
+        # The two buffers alternate
+        self.assertIs(sl.step(), silent_grid)
+        self.assertIs(sl.step(), grid)
+
+    def test_no_grid_allocations(self):
+        sl = SporeLife(random_init_grid(200, seed=1), alpha=0.5,
+                       engine="table", buffered=True)
+        sl.step(overcrowd_birth_p=0.5)
+        tracemalloc.start()
+        sl.step(overcrowd_birth_p=0.5, scramble=True)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(peak, sl.grid.nbytes)
+
+
+class TestEngines(unittest.TestCase):
+    """
+    The table engine has to reproduce the mask engine bit by bit.
+    """
+    def test_game_of_life_engines(self):
+        init_grid = random_init_grid(20, seed=1)
+        gol_mask = GameOfLife(init_grid, seed=2)
+        gol_table = GameOfLife(init_grid, seed=2, engine="table")
+        for _ in range(20):
+            np.testing.assert_array_equal(
+                gol_mask.step(overcrowd_birth_p=0.5),
+                gol_table.step(overcrowd_birth_p=0.5))
+
+    def test_spore_life_engines(self):
+        init_grid = random_init_grid(20, seed=1)
+        for kwargs in ({}, {"overcrowd_dormancy": True},
+                       {"overcrowd_birth_p": 0.5}, {"scramble": True}):
+            sl_mask = SporeLife(init_grid, alpha=0.5, seed=2)
+            sl_table = SporeLife(init_grid, alpha=0.5, seed=2, engine="table")
+            for _ in range(20):
+                np.testing.assert_array_equal(sl_mask.step(**kwargs),
+                                              sl_table.step(**kwargs))
+
+    def test_incremental_neighborhood(self):
+        for periodic_boundary in (True, False):
+            init_grid = random_init_grid(30, seed=1)
+            sl_full = SporeLife(init_grid, alpha=0.9, seed=2,
+                                periodic_boundary=periodic_boundary)
+            sl_inc = SporeLife(init_grid, alpha=0.9, seed=2,
+                               periodic_boundary=periodic_boundary,
+                               incremental=True)
+            gol_full = GameOfLife(init_grid, periodic_boundary=periodic_boundary)
+            gol_inc = GameOfLife(init_grid, periodic_boundary=periodic_boundary,
+                                 incremental=True)
+            for _ in range(200):
+                sl_full.step(), sl_inc.step(), gol_full.step(), gol_inc.step()
+                np.testing.assert_array_equal(sl_full.life_neighborhood_grid,
+                                              sl_inc.life_neighborhood_grid)
+                np.testing.assert_array_equal(gol_full.life_neighborhood_grid,
+                                              gol_inc.life_neighborhood_grid)
+            np.testing.assert_array_equal(sl_full.grid, sl_inc.grid)
+
+    def test_active_region(self):
+        for periodic_boundary in (True, False):
+            # Patch close to the border, growing across it
+            for top_left in ((10, 15), (1, 20)):
+                init_grid = random_patch(40, 7, top_left, seed=100)
+                sl_full = SporeLife(init_grid,
+                                    periodic_boundary=periodic_boundary)
+                sl_active = SporeLife(init_grid, active_region=True,
+                                      periodic_boundary=periodic_boundary)
+                gol_full = GameOfLife(init_grid,
+                                      periodic_boundary=periodic_boundary)
+                gol_active = GameOfLife(init_grid, active_region=True,
+                                        periodic_boundary=periodic_boundary)
+                for _ in range(100):
+                    np.testing.assert_array_equal(
+                        sl_full.step(overcrowd_dormancy=True),
+                        sl_active.step(overcrowd_dormancy=True))
+                    np.testing.assert_array_equal(
+                        sl_full.life_neighborhood_grid,
+                        sl_active.life_neighborhood_grid)
+                    np.testing.assert_array_equal(gol_full.step(),
+                                                  gol_active.step())
+                np.testing.assert_array_equal(sl_active.step(silent=True),
+                                              sl_full.step(silent=True))
+                self.assertEqual(sl_active.t, 100)
+
+    def test_active_region_extinct(self):
+        sl = SporeLife(np.full((5, 5), DEAD), alpha=0.5, active_region=True)
+        np.testing.assert_array_equal(sl.step(), np.full((5, 5), DEAD))
+        self.assertEqual(sl.t, 1)
+
+    def test_rule_tables(self):
+        self.assertEqual(GAME_OF_LIFE_TABLE.shape, (2, 3, 9))
+        self.assertEqual(SPORE_LIFE_TABLE.shape, (2, 2, 3, 9))
+        # Rows of the SporeLife table as documented in transitions.py
+        np.testing.assert_array_equal(SPORE_LIFE_TABLE[0, 0], [
+            [DEAD, DEAD, DEAD, ALIVE, DEAD, DEAD, DEAD, DEAD, DEAD],
+            [DEAD, SPORE, ALIVE, ALIVE, DEAD, DEAD, DEAD, DEAD, DEAD],
+            [SPORE, SPORE, ALIVE, ALIVE, SPORE, SPORE, SPORE, SPORE, SPORE],
+        ])
+
+class TestSporeLifeEnsemble(unittest.TestCase):
+    def test_ensemble_matches_realizations(self):
+        runs = 4
+        init_grids = np.array([random_init_grid(10, seed=i+1)
+                               for i in range(runs)])
+        seeds = [10 + i for i in range(runs)]
+        for kwargs, sampling in itertools.product(
+                ({}, {"overcrowd_birth_p": 0.5}, {"scramble": True}),
+                ("full", "sparse")):
+            ens = SporeLifeEnsemble(init_grids, alpha=0.6, seeds=seeds,
+                                    sampling=sampling)
+            sls = [SporeLife(init_grids[i], alpha=0.6, seed=seeds[i],
+                             sampling=sampling)
+                   for i in range(runs)]
+            for _ in range(10):
+                ngrids = ens.step(**kwargs)
+                for i, sl in enumerate(sls):
+                    np.testing.assert_array_equal(ngrids[i], sl.step(**kwargs))
+            np.testing.assert_array_equal(
+                ens.alive_count, [sl.alive_count for sl in sls])
+            np.testing.assert_array_equal(
+                ens.spore_count, [sl.spore_count for sl in sls])
+
+
+class TestNpyWriter(unittest.TestCase):
+    def test_blocks(self):
+        data = np.arange(24, dtype=np.uint16).reshape(4, 6)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "rows.npy")
+            with NpyWriter(path, (6,), np.uint16) as writer:
+                writer.append(data[:1])
+                writer.flush()
+                np.testing.assert_array_equal(np.load(path), data[:1])
+                writer.append(data[1:])
+            np.testing.assert_array_equal(np.load(path, mmap_mode="r"), data)
+            path = os.path.join(tmp_dir, "cols.npy")
+            with NpyWriter(path, (4,), np.uint16, fortran_order=True) as writer:
+                writer.append(data[:, :2])
+                writer.append(data[:, 2:])
+            np.testing.assert_array_equal(np.load(path, mmap_mode="r"), data)
+
+    def test_stream_time_series(self):
+        init_grids = np.array([random_init_grid(10, seed=s) for s in (1, 2, 3)])
+        alive_data, dorm_data = ensemble_time_series(
+            SporeLifeEnsemble(init_grids, alpha=0.5, seeds=[4, 5, 6]), 25)
+        ens = SporeLifeEnsemble(init_grids, alpha=0.5, seeds=[4, 5, 6])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            alive_writer = NpyWriter(os.path.join(tmp_dir, "alive.npy"), (3,),
+                                     np.uint8, fortran_order=True)
+            spore_writer = NpyWriter(os.path.join(tmp_dir, "spore.npy"), (3,),
+                                     np.uint8, fortran_order=True)
+            with alive_writer, spore_writer:
+                stream_time_series(ens, 25, alive_writer, spore_writer, chunk=7)
+            np.testing.assert_array_equal(
+                np.load(os.path.join(tmp_dir, "alive.npy")), alive_data)
+            np.testing.assert_array_equal(
+                np.load(os.path.join(tmp_dir, "spore.npy")), dorm_data)
+
+
+class TestResults(unittest.TestCase):
+    def test_round_trip(self):
+        data = np.arange(12.).reshape(3, 4)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = save_results(data, param=np.float64(0.5), header="test",
+                                base_path=tmp_dir, prefix="alpha-",
+                                metadata={"runs": np.int64(3)})
+            self.assertEqual(path, os.path.join(tmp_dir, "alpha-0.500.npz"))
+            loaded, metadata = load_results(path, with_metadata=True)
+            np.testing.assert_array_equal(loaded, data)
+            self.assertEqual(metadata,
+                             {"header": "test", "param": 0.5, "runs": 3})
+            self.assertEqual(os.listdir(tmp_dir), ["alpha-0.500.npz"])
+            # Readable like any other new file, not only by the owner
+            umask = os.umask(0o022)
+            try:
+                path = save_results(data, param=0.25, base_path=tmp_dir)
+            finally:
+                os.umask(umask)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o644)
+
+    def test_overwrite_policies(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            kwargs = {"param": 0.5, "base_path": tmp_dir, "prefix": "alpha-"}
+            path = save_results(np.zeros(2), **kwargs)
+            self.assertRaises(FileExistsError, save_results, np.ones(2),
+                              **kwargs)
+            self.assertIsNone(save_results(np.ones(2), overwrite="skip",
+                                           **kwargs))
+            self.assertEqual(
+                save_results(np.ones(2), overwrite="version", **kwargs),
+                os.path.join(tmp_dir, "alpha-0.500-v2.npz"))
+            np.testing.assert_array_equal(load_results(path), np.zeros(2))
+            save_results(np.ones(2), overwrite="overwrite", **kwargs)
+            np.testing.assert_array_equal(load_results(path), np.ones(2))
+
+    def test_text_files(self):
+        data = np.arange(6.).reshape(2, 3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_data(data, param=0.5, header="test", base_path=tmp_dir,
+                      prefix="alpha-")
+            self.assertRaises(FileExistsError, save_data, data, param=0.5,
+                              base_path=tmp_dir, prefix="alpha-")
+            loaded, metadata = load_results(
+                os.path.join(tmp_dir, "alpha-0.500.npz"), with_metadata=True)
+            np.testing.assert_array_equal(loaded, data)
+            self.assertEqual(metadata, {"header": "test"})
+
+    def test_time_series_files(self):
+        data = np.arange(6).reshape(2, 3)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Streamed .npy files are memory-mapped, older text files are
+            # found from the .npy path
+            npy_path = os.path.join(tmp_dir, "alpha-0.500.npy")
+            np.save(npy_path, data)
+            loaded = load_results(npy_path)
+            self.assertIsInstance(loaded, np.memmap)
+            np.testing.assert_array_equal(loaded, data)
+            del loaded
+            os.remove(npy_path)
+            save_data(data, param=0.5, base_path=tmp_dir, prefix="alpha-")
+            np.testing.assert_array_equal(load_results(npy_path), data)
+
+
+def _sweep_unit(alpha, runs, seeds, checkpoint):
+    return np.array([[alpha, run] for run in runs])
+
+
+def _random_sweep_unit(alpha, runs, seeds, checkpoint):
+    return np.array([[np.random.default_rng(grid_seed).random(),
+                      np.random.default_rng(step_seed).random()]
+                     for grid_seed, step_seed in seeds])
+
+
+def _profiled_sweep_unit(alpha, runs, seeds, checkpoint, profiler=None):
+    for grid_seed, step_seed in seeds:
+        sl = SporeLife(random_init_grid(10, seed=grid_seed), alpha=alpha,
+                       seed=step_seed)
+        sl.profiler = profiler
+        sl.step_until(5)
+    return np.zeros((len(runs), 1))
+
+
+class TestSweep(unittest.TestCase):
+    def test_seeded_statistics(self):
+        np.testing.assert_array_equal(
+            extinction_time_stastistics(0.2, 8, 0.37, 1000, 3, 20, seed=0),
+            extinction_time_stastistics(0.2, 8, 0.37, 1000, 3, 20, seed=0))
+        np.testing.assert_array_equal(random_init_grid(8, seed=0),
+                                      random_init_grid(8, seed=0))
+
+    def test_state_round_trip(self):
+        for cls in (GameOfLife, SporeLife):
+            ca = cls(random_init_grid(16, seed=1), seed=2)
+            ca.step_until(5)
+            restored = cls(random_init_grid(16, seed=3), seed=4)
+            restored.set_state(ca.get_state())
+            for _ in range(5):
+                ca.step(overcrowd_birth_p=0.5)
+                restored.step(overcrowd_birth_p=0.5)
+            self.assertEqual(restored.t, 10)
+            np.testing.assert_array_equal(restored.grid, ca.grid)
+            np.testing.assert_array_equal(restored.life_neighborhood_grid,
+                                          ca.life_neighborhood_grid)
+
+    def test_resume_extinction_time(self):
+        init_grid = random_init_grid(10, seed=1)
+        t_extinction = find_extinction_time(
+            SporeLife(init_grid, alpha=0.5, seed=2), 10_000, 20)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = Checkpoint(os.path.join(tmp_dir, "checkpoint.npz"))
+            self.assertEqual(find_extinction_time(
+                SporeLife(init_grid, alpha=0.5, seed=2), 10_000, 20,
+                checkpoint=checkpoint, checkpoint_interval=20), t_extinction)
+            # Resume a run from the last checkpoint before extinction
+            sl = SporeLife(init_grid, alpha=0.5)
+            checkpoint.restore(sl)
+            self.assertGreater(sl.t, 0)
+            save, saved_at = checkpoint.save, []
+            def record_save(ca, **extra):
+                saved_at.append(ca.t)
+                save(ca, **extra)
+            with mock.patch.object(checkpoint, "save", record_save):
+                self.assertEqual(find_extinction_time(
+                    SporeLife(init_grid, alpha=0.5), 10_000, 20,
+                    checkpoint=checkpoint, checkpoint_interval=20),
+                    t_extinction)
+            # The restored checkpoint is not written again
+            self.assertNotIn(sl.t, saved_at)
+
+    def test_pending_units(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sweep = Sweep(tmp_dir, [0.25, 0.5], runs=5, chunk_size=2)
+            self.assertEqual(sweep.n_chunks, 3)
+            self.assertEqual(list(sweep.chunk_runs(2)), [4])
+            sweep.save(0.5, 1, _sweep_unit(0.5, sweep.chunk_runs(1), None, None))
+            self.assertEqual(len(sweep.pending()), 5)
+            self.assertNotIn((0.5, 1), sweep.pending())
+            merged = []
+            sweep.run(_sweep_unit, merge=merged.append, processes=2)
+            self.assertEqual(sweep.pending(), [])
+            self.assertCountEqual(merged, [0.25, 0.5])
+            np.testing.assert_array_equal(
+                sweep.results(0.25), [[0.25, run] for run in range(5)])
+            # Finished alphas are merged right away when running again
+            merged = []
+            sweep.run(_sweep_unit, merge=merged.append)
+            self.assertEqual(merged, [0.25, 0.5])
+
+    def test_seeds(self):
+        results = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for chunk_size, processes in ((1, 1), (3, 2)):
+                sweep = Sweep(os.path.join(tmp_dir, str(chunk_size)),
+                              [0.25, 0.5], runs=4, chunk_size=chunk_size,
+                              seed=1)
+                sweep.run(_random_sweep_unit, processes=processes)
+                results.append([sweep.results(alpha) for alpha in sweep.alphas])
+            # Independent of chunks and processes, but not of alpha and run
+            np.testing.assert_array_equal(results[0], results[1])
+            self.assertEqual(np.unique(results[0]).size, 16)
+            # The seed is stored with the sweep
+            self.assertEqual(Sweep(os.path.join(tmp_dir, "1"), [0.25], 4).seed, 1)
+            self.assertRaises(ValueError, Sweep, os.path.join(tmp_dir, "1"),
+                              [0.25], 4, seed=2)
+
+    def test_profiles(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sweep = Sweep(tmp_dir, [0.25, 0.5], runs=3, chunk_size=2)
+            sweep.run(_profiled_sweep_unit, processes=2, profile=True)
+            for alpha in sweep.alphas:
+                timers = sweep.profile(alpha).timers
+                # Summed over the workers of both chunks of alpha
+                self.assertEqual(timers["rule"].calls, 15)
+                self.assertEqual(timers["decay"].calls, 15)
+            # Units without profiling are left out
+            sweep = Sweep(os.path.join(tmp_dir, "plain"), [0.25], runs=1)
+            sweep.run(_profiled_sweep_unit)
+            self.assertEqual(sweep.profile(0.25).timers, {})
+
+
+class TestPacked(unittest.TestCase):
+    """
+    The packed automata have to reproduce the deterministic dynamics exactly.
+    """
+    def test_pack_roundtrip(self):
+        for N in (3, 64, 70):
+            plane = random_init_grid(N, seed=N) == ALIVE
+            words = pack_plane(plane)
+            self.assertEqual(words.shape, (N, -(-N // 64)))
+            np.testing.assert_array_equal(unpack_plane(words, N), plane)
+            self.assertEqual(popcount(words), np.count_nonzero(plane))
+
+    def test_packed_game_of_life(self):
+        for N, periodic_boundary in ((20, True), (70, True), (70, False)):
+            init_grid = random_init_grid(N, seed=N)
+            gol = GameOfLife(init_grid, periodic_boundary=periodic_boundary)
+            pgol = PackedGameOfLife(init_grid,
+                                    periodic_boundary=periodic_boundary)
+            np.testing.assert_array_equal(gol.life_neighborhood_grid,
+                                          pgol.life_neighborhood_grid)
+            for _ in range(20):
+                np.testing.assert_array_equal(gol.step(), pgol.step())
+            self.assertEqual(gol.alive_count, pgol.alive_count)
+
+    def test_packed_spore_life(self):
+        for N, periodic_boundary in ((20, True), (128, True), (70, False)):
+            init_grid = random_init_grid(N, seed=N)
+            for overcrowd_dormancy in (False, True):
+                sl = SporeLife(init_grid, periodic_boundary=periodic_boundary)
+                psl = PackedSporeLife(init_grid,
+                                      periodic_boundary=periodic_boundary)
+                for _ in range(20):
+                    np.testing.assert_array_equal(
+                        sl.step(overcrowd_dormancy=overcrowd_dormancy),
+                        psl.step(overcrowd_dormancy=overcrowd_dormancy))
+                psl.step_until(40, overcrowd_dormancy=overcrowd_dormancy)
+                sl.step_until(40)
+                self.assertEqual(psl.t, 40)
+                self.assertEqual(sl.spore_count + sl.alive_count
+                                 + sl.count_state(DEAD), N**2)
+                self.assertEqual(psl.spore_count + psl.alive_count
+                                 + psl.count_state(DEAD), N**2)
+
+    def test_packed_game_of_life_limit(self):
+        test_grid = np.array([
+            [DEAD, ALIVE, DEAD],
+            [DEAD, ALIVE, DEAD],
+            [DEAD, DEAD, DEAD]
+        ])
+        psl = PackedSporeLife(test_grid, alpha=0, periodic_boundary=False)
+        np.testing.assert_array_equal(psl.step(), np.full((3, 3), DEAD))
+
+    def test_packed_stochastic_step(self):
+        # Spores die with probability 1 - alpha
+        psl = PackedSporeLife(np.full((100, 100), SPORE), alpha=0.3, seed=1)
+        psl.step()
+        self.assertEqual(psl.alive_count, 0)
+        self.assertAlmostEqual(psl.spore_count / 100**2, 0.3, delta=0.03)
+
+
+class TestHashLife(unittest.TestCase):
+    """
+    HashLife has to reproduce the deterministic dynamics exactly.
+    """
+    def test_hash_spore_life(self):
+        for N in (4, 16, 32):
+            for overcrowd_dormancy in (False, True):
+                init_grid = random_init_grid(N, seed=N)
+                sl = SporeLife(init_grid)
+                hsl = HashSporeLife(init_grid,
+                                    overcrowd_dormancy=overcrowd_dormancy)
+                np.testing.assert_array_equal(sl.grid, hsl.grid)
+                for t in (1, 2, 3, 7, 16, 37, 70):
+                    while sl.t < t:
+                        sl.step(overcrowd_dormancy=overcrowd_dormancy)
+                    np.testing.assert_array_equal(sl.grid, hsl.step_until(t))
+                    self.assertEqual(sl.alive_count, hsl.alive_count)
+                    self.assertEqual(sl.spore_count, hsl.spore_count)
+                np.testing.assert_array_equal(
+                    sl.step(silent=True, overcrowd_dormancy=overcrowd_dormancy),
+                    hsl.step(silent=True))
+                self.assertEqual(hsl.t, 70)
+
+    def test_hash_game_of_life_bounded_cache(self):
+        init_grid = random_init_grid(16, seed=1)
+        gol = GameOfLife(init_grid)
+        hgol = HashGameOfLife(init_grid, max_nodes=50)
+        for t in (1, 5, 33, 90):
+            gol.step_until(t)
+            np.testing.assert_array_equal(gol.grid, hgol.step_until(t))
+        self.assertLessEqual(len(hgol.hashlife.nodes), 50)
+        self.assertLessEqual(len(hgol.hashlife.results), 50)
+
+    def test_still_life_jump(self):
+        block = np.full((64, 64), DEAD)
+        block[10:12, 10:12] = ALIVE
+        hsl = HashSporeLife(block)
+        np.testing.assert_array_equal(hsl.step_until(10**6), block)
+
+
+class TestObservers(unittest.TestCase):
+    def record(self, ca):
+        records = []
+        ca.add_observer(lambda ca, transitions, old_grid, new_grid, region:
+                        records.append((ca.t, transitions.copy())))
+        return records
+
+    def test_transitions(self):
+        sl = SporeLife(random_init_grid(30, seed=1), alpha=0.5, seed=1)
+        records = self.record(sl)
+        old_grid = sl.grid.copy()
+        new_grid = sl.step()
+        self.assertEqual(len(records), 1)
+        t, transitions = records[0]
+        self.assertEqual(t, 1)
+        for i in (DEAD, ALIVE, SPORE):
+            for j in (DEAD, ALIVE, SPORE):
+                self.assertEqual(transitions[i, j],
+                                 np.sum((old_grid == i) & (new_grid == j)))
+        self.assertEqual(transitions.sum(axis=0)[ALIVE], sl.alive_count)
+        self.assertEqual(transitions.sum(axis=0)[SPORE], sl.spore_count)
+        sl.step(silent=True)
+        self.assertEqual(len(records), 1)
+
+    def test_active_region(self):
+        init_grid = random_patch(40, 8, (16, 16), seed=2)
+        sl = SporeLife(init_grid, alpha=0)
+        sl_active = SporeLife(init_grid, alpha=0, active_region=True)
+        records, records_active = self.record(sl), self.record(sl_active)
+        sl.step_until(10)
+        sl_active.step_until(10)
+        for (t, transitions), (t_active, transitions_active) in zip(
+                records, records_active):
+            self.assertEqual(t, t_active)
+            np.testing.assert_array_equal(transitions, transitions_active)
+
+
+class TestTransitionCounts(unittest.TestCase):
+    def test_legacy_equivalence(self):
+        sl = SporeLife(random_init_grid(30, seed=1), alpha=0.5, seed=1)
+        timer = Timer()
+        for _ in range(10):
+            np.testing.assert_array_equal(count_transitions(sl, timer),
+                                          legacy_count_transitions(sl))
+            sl.step()
+        self.assertEqual(timer.calls, 10)
+
+    def test_ensemble(self):
+        init_grids = np.array([random_init_grid(20, seed=s) for s in (1, 2, 3)])
+        seeds = [4, 5, 6]
+        ens = SporeLifeEnsemble(init_grids, alpha=0.5, seeds=seeds)
+        counts = count_transitions_ensemble(ens, 25, 5, chunk=4)
+        expected = np.zeros((3, 9))
+        for init_grid, seed in zip(init_grids, seeds):
+            sl = SporeLife(init_grid, alpha=0.5, seed=seed)
+            sl.step_until(5)
+            while sl.t < 25:
+                expected += count_transitions(sl)
+                sl.step()
+        np.testing.assert_array_equal(counts, expected)
+        self.assertEqual(ens.t, 25)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_phases(self):
+        for engine in ("mask", "table"):
+            init_grid = random_init_grid(20, seed=1)
+            sl = SporeLife(init_grid, alpha=0.5, seed=2, engine=engine)
+            profiled = SporeLife(init_grid, alpha=0.5, seed=2, engine=engine)
+            profiled.profiler = Profiler()
+            profiled.add_observer(lambda *_: None)
+            for _ in range(4):
+                np.testing.assert_array_equal(
+                    profiled.step(overcrowd_birth_p=0.5, scramble=True),
+                    sl.step(overcrowd_birth_p=0.5, scramble=True))
+            timers = profiled.profiler.timers
+            for name in ("neighbors", "births", "rule", "decay", "scramble",
+                         "bookkeeping", "observers"):
+                self.assertEqual(timers[name].calls, 4)
+                self.assertGreater(timers[name].total, 0)
+
+    def test_striped_and_ensemble(self):
+        sl = SporeLife(random_init_grid(20, seed=1), alpha=0.5, seed=2,
+                       threads=2)
+        sl.profiler = Profiler()
+        sl.step_until(3)
+        self.assertEqual(sl.profiler.timers["stripes"].calls, 3)
+        # Phases within the stripes are not timed
+        self.assertNotIn("rule", sl.profiler.timers)
+        ens = SporeLifeEnsemble(np.array([random_init_grid(10, seed=1)] * 2),
+                                alpha=0.5, seeds=[1, 2])
+        ens.profiler = Profiler()
+        ens.step()
+        self.assertEqual(
+            set(ens.profiler.timers), {"neighbors", "rule", "decay"})
+
+    def test_merge(self):
+        profiler = Profiler()
+        with profiler.phase("rule"):
+            pass
+        with profiler.phase("rule"):
+            pass
+        copy = pickle.loads(pickle.dumps(profiler))
+        restored = Profiler.from_dict(profiler.to_dict())
+        merged = Profiler().merge(copy).merge(restored)
+        self.assertEqual(merged.timers["rule"].calls, 4)
+        self.assertAlmostEqual(merged.timers["rule"].total,
+                               2 * profiler.timers["rule"].total)
+        self.assertIn("rule", merged.report(title="alpha = 0.500"))
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_suite(self):
+        results = run_suite(sizes=(8,), alphas=(0.5, 1), engines=["table"],
+                            cell_budget=0)
+        # Two alphas for stochastic SporeLife steps and the helpers
+        self.assertEqual(len(results),
+                         len(STEP_CASES) + 4 + 2 * len(HELPER_CASES))
+        for result in results:
+            self.assertEqual(result["steps"], 3)
+            self.assertGreater(result["cell_updates_per_s"], 0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "suite.json")
+            save_suite(results, path)
+            old = load_suite(path)
+        self.assertEqual(old["results"], results)
+        self.assertIn("commit", old["machine"])
+        new = {"results": [dict(r, cell_updates_per_s=r["cell_updates_per_s"]
+                                / 2) for r in results[:3]]}
+        comparison = compare_suites(old, new)
+        self.assertEqual(len(comparison), 3)
+        for c in comparison:
+            self.assertAlmostEqual(c["ratio"], 0.5)
+            self.assertTrue(c["regression"])
+        # Suites of other sizes share no benchmarks
+        disjoint = {"results": [dict(r, N=16) for r in results]}
+        self.assertEqual(compare_suites(old, disjoint), [])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [os.path.join(tmp_dir, name) for name in ("a", "b")]
+            save_suite(results, paths[0])
+            save_suite(disjoint["results"], paths[1])
+            process = subprocess.run(
+                [sys.executable, "benchmark.py", "--compare", *paths],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                capture_output=True, text=True)
+        self.assertNotEqual(process.returncode, 0)
+        self.assertIn("share no benchmarks", process.stderr)
+
+
+class TestBatchMeanField(unittest.TestCase):
+    def test_matches_scalar(self):
+        inits = np.array([0.05, 0.2, 0.4])
+        alphas = np.array([0, 0.3, 1])
+        for n_neighbors, damping in ((8, 0), (6, 0.2)):
+            mf = BatchMFSporeLife(inits, 0.1, alpha=alphas[:, np.newaxis],
+                                  n_neighbors=n_neighbors, damping=damping)
+            histories = mf.step_until(30)
+            self.assertEqual(histories[0].shape, (32, 3, 3))
+            for i, alpha in enumerate(alphas):
+                for j, rho_a in enumerate(inits):
+                    scalar = MFSporeLife((rho_a, 0.1, 0.9 - rho_a),
+                                         alpha=alpha, n_neighbors=n_neighbors,
+                                         damping=damping).step_until(30)
+                    for history, scalar_history in zip(histories, scalar):
+                        np.testing.assert_allclose(history[:, i, j],
+                                                   scalar_history, atol=1e-12)
+
+    def test_growing_history(self):
+        mf = BatchMFSporeLife([0.3, 0.5], 0, alpha=0.5)
+        for _ in range(5):
+            mf.step()
+        mf.step_until(10)
+        self.assertEqual(mf.t, 11)
+        mf_once = BatchMFSporeLife([0.3, 0.5], 0, alpha=0.5)
+        mf_once.step_until(10)
+        np.testing.assert_array_equal(mf.alive_densities,
+                                      mf_once.alive_densities)
+
+
+class TestMeanFieldFixedPoints(unittest.TestCase):
+    def test_jacobian(self):
+        rng = np.random.default_rng(1)
+        rho_a, rho_i = rng.uniform(0.01, 0.5, 10), rng.uniform(0, 0.4, 10)
+        alpha = rng.uniform(0, 1, 10)
+        J = mf_jacobian(rho_a, rho_i, alpha, 8, 0.3)
+        h = 1e-7
+        for k, (da, di) in enumerate(((h, 0), (0, h))):
+            plus = mf_step(rho_a + da, rho_i + di, alpha, 8, 0.3)
+            minus = mf_step(rho_a - da, rho_i - di, alpha, 8, 0.3)
+            for l in range(2):
+                np.testing.assert_allclose(J[:, l, k],
+                                           (plus[l] - minus[l]) / (2 * h),
+                                           atol=1e-7)
+
+    def test_fixed_points(self):
+        alphas = np.array([0, 0.5, 1])
+        # Active state and the threshold between it and extinction
+        rho_a, rho_i, converged = find_fixed_points(
+            [[0.4], [0.2]], 0.05, alphas)
+        self.assertTrue(np.all(converged))
+        np.testing.assert_allclose(mf_step(rho_a, rho_i, alphas),
+                                   (rho_a, rho_i), atol=1e-12)
+        stable = spectral_radius(rho_a, rho_i, alphas) < 1
+        np.testing.assert_array_equal(stable, [[True] * 3, [False] * 3])
+        # The active state is the long time limit of the iteration
+        mf = BatchMFSporeLife(0.5, 0, alpha=alphas)
+        mf.step_until(2000)
+        np.testing.assert_allclose(mf.rho_a, rho_a[0], atol=1e-10)
+
+    def test_continuation(self):
+        alphas = np.linspace(0, 1, 21)
+        branches = continue_fixed_points(alphas, 0.36, 0.05)
+        self.assertTrue(np.all(branches["converged"]))
+        self.assertTrue(np.all(branches["stable"]))
+        rho_a, rho_i, _ = find_fixed_points(0.36, 0.05, alphas)
+        np.testing.assert_allclose(branches["alive"], rho_a, atol=1e-12)
+        np.testing.assert_allclose(branches["spore"], rho_i, atol=1e-12)
+
+
+class TestPairApproximation(unittest.TestCase):
+    def test_first_step_marginal(self):
+        # Uncorrelated cells have independent neighbors, so the single site
+        # marginal after one step is exact
+        alpha, rho = 0.4, np.array([0.5, 0.3, 0.2])
+        pa = PairSporeLife(rho[ALIVE], rho[SPORE], alpha=alpha)
+        pa.step()
+        expected = np.zeros(3)
+        for state in (DEAD, ALIVE, SPORE):
+            for c in range(9):
+                p = rho[state] * binom.pmf(c, 8, rho[ALIVE])
+                new_state = SPORE_LIFE_TABLE[0, 0, state, c]
+                if new_state == SPORE:
+                    expected[SPORE] += alpha * p
+                    expected[DEAD] += (1 - alpha) * p
+                else:
+                    expected[new_state] += p
+        np.testing.assert_allclose(
+            (pa.rho_d, pa.rho_a, pa.rho_i), expected, atol=1e-14)
+        # Damped by the same convex mix as mf_step, with the same arguments as
+        # BatchMFSporeLife
+        damping = np.array([0, 0.3])
+        kwargs = dict(alpha=alpha, n_neighbors=8, damping=damping)
+        BatchMFSporeLife(rho[ALIVE], rho[SPORE], **kwargs).step()
+        damped = PairSporeLife(rho[ALIVE], rho[SPORE], **kwargs)
+        damped.step()
+        np.testing.assert_allclose(
+            damped.rho_a, (1 - damping) * pa.rho_a + damping * rho[ALIVE],
+            atol=1e-14)
+        np.testing.assert_allclose(
+            damped.rho_i,
+            (1 - damping) * pa.rho_i + damping * alpha * rho[SPORE],
+            atol=1e-14)
+        np.testing.assert_allclose(damped.pairs.sum(axis=(-2, -1)), 1)
+
+    def test_pairs(self):
+        alphas = np.linspace(0, 1, 5)
+        pa = PairSporeLife(0.3, 0.1, alpha=alphas)
+        histories = pa.step_until(20)
+        self.assertEqual(histories[0].shape, (22, 5))
+        np.testing.assert_allclose(pa.pairs, np.swapaxes(pa.pairs, -1, -2),
+                                   atol=1e-15)
+        np.testing.assert_allclose(pa.pairs.sum(axis=(-2, -1)), 1)
+        np.testing.assert_allclose(pa.pairs[..., ALIVE, :].sum(axis=-1),
+                                   pa.rho_a)
+        # Batched alphas equal single runs
+        for alpha, history in zip(alphas, histories[0].T):
+            single = PairSporeLife(0.3, 0.1, alpha=alpha)
+            np.testing.assert_allclose(single.step_until(20)[0], history,
+                                       atol=1e-14)
+
+
+class TestFindCycle(unittest.TestCase):
+    def test_fixed_point(self):
+        block = np.full((6, 6), DEAD)
+        block[2:4, 2:4] = ALIVE
+        gol = GameOfLife(block)
+        self.assertEqual(gol.find_cycle(100), (0, 1))
+        self.assertEqual(gol.period, 1)
+
+    def test_blinker(self):
+        test_grid = np.array([ # SporeLife blinker
+            [DEAD, DEAD, DEAD],
+            [DEAD, SPORE, ALIVE],
+            [DEAD, ALIVE, SPORE]
+        ])
+        sl = SporeLife(test_grid, periodic_boundary=False)
+        self.assertEqual(sl.find_cycle(100), (0, 2))
+        np.testing.assert_array_equal(sl.grid, test_grid)
+        self.assertEqual(sl.t, 2)
+
+    def test_transient(self):
+        test_grid = np.array([
+            [DEAD, ALIVE, DEAD],
+            [DEAD, ALIVE, DEAD],
+            [DEAD, DEAD, DEAD]
+        ])
+        sl = SporeLife(test_grid, alpha=0, periodic_boundary=False)
+        self.assertEqual(sl.find_cycle(100), (1, 1))
+
+    def test_no_cycle_within_period(self):
+        glider = np.full((8, 8), DEAD)
+        glider[0, 1] = glider[1, 2] = glider[2, 0] = glider[2, 1] = glider[2, 2] = ALIVE
+        self.assertEqual(GameOfLife(glider).find_cycle(100, max_period=10),
+                         (-1, 0))
+        # On the 8 x 8 torus the glider returns after 32 steps
+        for cls in (GameOfLife, PackedGameOfLife, HashGameOfLife):
+            gol = cls(glider)
+            steps = []
+            if cls is GameOfLife:
+                gol.add_observer(lambda ca, *_: steps.append(ca.t))
+            self.assertEqual(gol.find_cycle(100), (0, 32))
+            # Left where the grid first repeats, the cycle is confirmed on a
+            # copy
+            self.assertEqual(gol.t, 32)
+            np.testing.assert_array_equal(gol.grid, glider)
+            if cls is GameOfLife:
+                self.assertEqual(steps, list(range(1, 33)))
+
+    def test_stochastic(self):
+        sl = SporeLife(random_init_grid(5, seed=1), alpha=0.5)
+        self.assertFalse(sl.is_deterministic())
+        self.assertFalse(SporeLife(sl.grid).is_deterministic(
+            overcrowd_birth_p=0.5))
+        self.assertRaises(AssertionError, sl.find_cycle, 100)
+
+
 #     # def test_transitions(self):
 #     #     test_grid = np.array([
 #     #         [DEAD, ALIVE, SPORE],
@@ -180,7 +1158,7 @@ class TestSporeLifeStochasticity(unittest.TestCase):
 #     #     self.assertEqual(gol.transitions_from(test_grid, DEAD, ALIVE), 0)
         
 
-from lifetime_distribution import lifetime_distribution
+from lifetime_distribution import lifetime_distribution, lifetime_histograms
 
 class TestLifetimeDistribution(unittest.TestCase):
     def test_lifetime_measuring(self):
@@ -242,6 +1220,18 @@ class TestLifetimeDistribution(unittest.TestCase):
             lifetime_distribution(ALIVE, dl, 3, 0, ignore_transient_dynamics=1),
             {0: 6})
 
+    def test_histograms_single_run(self):
+        test_grid = random_init_grid(20, seed=1)
+        histograms = lifetime_histograms(SporeLife(test_grid, alpha=0.5, seed=2),
+                                         50, 10)
+        for state in (ALIVE, SPORE):
+            distribution = lifetime_distribution(
+                state, SporeLife(test_grid, alpha=0.5, seed=2), 50, 10)
+            self.assertDictEqual(
+                {n: histograms[state][n]
+                 for n in np.flatnonzero(histograms[state])},
+                distribution)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,15 +1,20 @@
 import sys, os
+from contextlib import nullcontext
 import numpy as np
-import multiprocessing
-from gol import SporeLife
-from util import random_init_grid, save_data
+from gol import SporeLife, SporeLifeEnsemble
+from sweep import Sweep
+from util import NpyWriter, Timer, random_init_grid, run_seeds, save_results
 
 
 PARAMS = (grid_size, q, t_max, runs) = (
           20, 0.3701, 10_000, 200)
+METADATA = dict(grid_size=grid_size, q=q, t_max=t_max, runs=runs)
 BASE_PATH = f"data/spore-life/time-series/grid-size-{grid_size}"
 ALPHAS = np.linspace(0, 1, 50)
 
+# Time the phases of the steps with --profile, printed per alpha at the end
+PROFILE = "--profile" in sys.argv
+
 def alive_dorm_time_series(sl: SporeLife,
                            t_max: int) -> tuple[np.ndarray, np.ndarray]:
     """
@@ -26,41 +31,123 @@ def alive_dorm_time_series(sl: SporeLife,
     return alive_data, dorm_data
 
 
+def ensemble_time_series(ens: SporeLifeEnsemble, t_max: int,
+                         progress_updates: bool = False
+                         ) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the time series for all realizations of the given
+    SporeLifeEnsemble ens until t_max returning the number of alive cells and
+    dorm cells on the way, one row per realization.
+    """
+    assert 0 <= ens.t < t_max
+    t0 = ens.t
+    alive_data = np.zeros((ens.R, t_max - ens.t))
+    dorm_data = np.zeros((ens.R, t_max - ens.t))
+    while ens.t < t_max:
+        if progress_updates and (ens.t - t0) % 100 == 0:
+            sys.stdout.write(f"\r{round((ens.t-t0)/(t_max-t0) * 100, 1)}%")
+            sys.stdout.flush()
+        alive_data[:, ens.t-t0] = ens.alive_count
+        dorm_data[:, ens.t-t0] = ens.spore_count
+        ens.step()
+    return alive_data, dorm_data
+
+
+def stream_time_series(ens: SporeLifeEnsemble, t_max: int,
+                       alive_writer: NpyWriter, spore_writer: NpyWriter,
+                       chunk: int = 1000, progress_updates: bool = False,
+                       timer: Timer = None):
+    """
+    Computes the same time series as ensemble_time_series, but appends them to
+    the given writers in blocks of chunk time steps, so that memory does not
+    grow with t_max. The writers need the shape (ens.R,) and fortran_order, to
+    grow along the time axis. If given, the time spent on the counts and the
+    writers is accumulated in timer.
+    """
+    assert 0 <= ens.t < t_max
+    t0 = ens.t
+    alive_data = np.empty((ens.R, chunk), dtype=alive_writer.dtype)
+    dorm_data = np.empty((ens.R, chunk), dtype=spore_writer.dtype)
+    k = 0
+    while ens.t < t_max:
+        if progress_updates and (ens.t - t0) % 100 == 0:
+            sys.stdout.write(f"\r{round((ens.t-t0)/(t_max-t0) * 100, 1)}%")
+            sys.stdout.flush()
+        with timer or nullcontext():
+            alive_data[:, k] = ens.alive_count
+            dorm_data[:, k] = ens.spore_count
+        k += 1
+        ens.step()
+        if k == chunk or ens.t == t_max:
+            with timer or nullcontext():
+                alive_writer.append(alive_data[:, :k])
+                spore_writer.append(dorm_data[:, :k])
+                alive_writer.flush()
+                spore_writer.flush()
+            k = 0
+
+
 def time_series_statistics(alpha: float, grid_size: int, q: float, t_max: int,
-                           runs: int, progress_updates: bool = True):
+                           runs: int, progress_updates: bool = True,
+                           seed: int = None):
     """
     Compute ALIVE and SPORE time series for DormantLife on grid_size x grid_size
     grid with initial alive probability q. Returns runs time series as data
-    arrays, one for ALIVE one for SPORE
+    arrays, one for ALIVE one for SPORE. All runs are stepped at once as a
+    SporeLifeEnsemble, seeded from seed as in a sweep, see util.run_seeds.
     """
-    alive_data, spore_data = np.zeros((runs, t_max)), np.zeros((runs, t_max))
-    for i in range(runs):
-        if progress_updates:
-            sys.stdout.write(f"\r{round(i/runs * 100, 1)}%")
-            sys.stdout.flush()
-        sl = SporeLife(random_init_grid(grid_size, q), alpha=alpha)
-        alive_data[i], spore_data[i] = alive_dorm_time_series(sl, t_max)
-    return alive_data, spore_data
+    grid_seeds, step_seeds = zip(*[run_seeds(seed, alpha, i)
+                                   for i in range(runs)])
+    init_grids = np.array([random_init_grid(grid_size, q, grid_seed)
+                           for grid_seed in grid_seeds])
+    ens = SporeLifeEnsemble(init_grids, alpha=alpha, seeds=step_seeds,
+                            sampling="sparse")
+    return ensemble_time_series(ens, t_max, progress_updates)
+
+
+# Counts of at most grid_size**2 cells, stored with the smallest dtype
+DTYPE = np.min_scalar_type(grid_size**2)
+
+
+def _unit(alpha, runs, seeds, checkpoint, profiler=None):
+    """
+    Stream the time series of the chunk of runs to alive.npy and spore.npy in
+    the directory of the unit.
+    """
+    grid_seeds, step_seeds = zip(*seeds)
+    init_grids = np.array([random_init_grid(grid_size, q, grid_seed)
+                           for grid_seed in grid_seeds])
+    ens = SporeLifeEnsemble(init_grids, alpha=alpha, seeds=step_seeds,
+                            sampling="sparse")
+    ens.profiler = profiler
+    alive_writer = NpyWriter(os.path.join(checkpoint.directory, "alive.npy"),
+                             (len(runs),), DTYPE, fortran_order=True)
+    spore_writer = NpyWriter(os.path.join(checkpoint.directory, "spore.npy"),
+                             (len(runs),), DTYPE, fortran_order=True)
+    timer = profiler.phase("observables") if profiler is not None else None
+    with alive_writer, spore_writer:
+        stream_time_series(ens, t_max, alive_writer, spore_writer, timer=timer)
 
 
-def _f(alpha):
-    print(f"\nalpha = {alpha}")
-    alive_header = f"time_series.py -- Number of ALIVE cells over time in SporeLife -- alpha = {alpha}, (grid_size, q, t_max, runs) = {str(PARAMS)}"
-    spore_header = f"time_series.py -- Number of SPORE cells over time in SporeLife -- alpha = {alpha}, (grid_size, q, t_max, runs) = {str(PARAMS)}"
-    alive_data, spore_data = time_series_statistics(alpha, *PARAMS)
-    save_data(alive_data, param=alpha, header=alive_header, base_path=BASE_PATH,
-              prefix="alpha-", sub_path="alive")
-    save_data(spore_data, param=alpha, header=spore_header, base_path=BASE_PATH,
-              prefix="alpha-", sub_path="spore")
+def _save(sweep, alpha):
+    """
+    Join the time series of all chunks of alpha, one chunk in memory at a time.
+    """
+    file_name = "alpha-%.3f.npy"%alpha
+    for name in ("alive", "spore"):
+        with NpyWriter(os.path.join(BASE_PATH, name, file_name), (t_max,),
+                       DTYPE) as writer:
+            for chunk in range(sweep.n_chunks):
+                writer.append(np.load(sweep.unit_path(alpha, chunk, name+".npy"),
+                                      mmap_mode="r"))
 
 
 if __name__ == "__main__":
-    save_data(ALPHAS, prefix="alpha-range", header="time_series.py -- Number of ALIVE / SPORE cells over time in SporeLife -- Alpha values for which data is stored",
-              base_path=BASE_PATH)
-    
-    with multiprocessing.Pool(processes=6) as pool:
-        # Use imap_unordered to apply the function to each value of alpha in 
-        # parallel and yield the results as they are ready, regardless of the
-        # order 
-        for _ in pool.imap_unordered(_f, ALPHAS):
-            pass
+    save_results(ALPHAS, prefix="alpha-range", header="time_series.py -- Number of ALIVE / SPORE cells over time in SporeLife -- Alpha values for which data is stored",
+                 base_path=BASE_PATH, metadata=METADATA, overwrite="overwrite")
+    # Finished chunks of runs are kept when the sweep is restarted
+    sweep = Sweep(BASE_PATH, ALPHAS, runs, chunk_size=50)
+    sweep.run(_unit, merge=lambda alpha: _save(sweep, alpha),
+              profile=PROFILE)
+    if PROFILE:
+        sweep.print_profiles()
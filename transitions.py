@@ -1,75 +1,123 @@
-import sys, os
+import sys
+from contextlib import nullcontext
 import numpy as np
-import multiprocessing
-from gol import SporeLife
-from gol import ALIVE, DEAD, SPORE
-from util import random_init_grid, save_data
-
-from time import time
-TT = 0
+from gol import SporeLife, SporeLifeEnsemble
+from sweep import Sweep
+from util import Timer, random_init_grid, run_seeds, save_results
 
 BASE_PATH = "data/spore-life/state-transitions/transition-table/"
 PARAMS = (grid_size, q, t_max, t_trans, runs) = (
           300, 0.3701, 10_000, 200, 30)
+METADATA = dict(grid_size=grid_size, q=q, t_max=t_max, t_trans=t_trans, runs=runs)
 ALPHAS = np.linspace(0, 1, 50)
 
-# FIXME: Boost performance for count computation
-def count_transitions(sl: SporeLife) -> np.ndarray:
+# Time the phases of the steps with --profile, printed per alpha at the end
+PROFILE = "--profile" in sys.argv
+
+
+def count_transitions(sl: SporeLife, timer: Timer = None) -> np.ndarray:
     """
     Find counts for SporeLife rule table:
         STATE | ALIVE NEIGHBORS
         D     | D D D A D D D D D
         A     | D S A A D D D D D
         S     | S S A A S S S S S
-    Each element contains the respective counts of ALIVE neighbors.
+    Each element contains the respective counts of ALIVE neighbors. The table
+    is filled by a single bincount of the combined index state * 9 + c. If
+    given, the time spent is accumulated in timer.
     """
-    global TT
-    counts = np.zeros((3, 9))
-    c = sl.life_neighborhood_grid
-    # Fill table with counts
-    t0 = time()
-    counts[DEAD] = [np.sum((sl.grid == DEAD) & (c == n)) for n in range(9)]
-    counts[ALIVE] = [np.sum((sl.grid == ALIVE) & (c == n)) for n in range(9)]
-    counts[SPORE] = [np.sum((sl.grid == SPORE) & (c == n)) for n in range(9)]
-    TT += time() - t0
-    return counts
-
-
-def count_transitions_time_avg(sl: SporeLife, t_max: int, t_trans: int):
+    with timer or nullcontext():
+        idx = sl.grid * 9 # at most 27 entries, fits into the uint8 grid dtype
+        idx += sl.life_neighborhood_grid
+        return np.bincount(idx.ravel(), minlength=27).reshape(3, 9)
+
+
+def count_transitions_time_avg(sl: SporeLife, t_max: int, t_trans: int,
+                               timer: Timer = None):
     assert sl.t + t_trans <= t_max
     sl.step_until(t_trans)
     data = np.zeros((3, 9))
     while sl.t < t_max:
-        data += count_transitions(sl)
+        data += count_transitions(sl, timer)
         sl.step()
     return data / (t_max - t_trans)
 
 
+def count_transitions_ensemble(ens: SporeLifeEnsemble, t_max: int,
+                               t_trans: int, chunk: int = 8,
+                               timer: Timer = None) -> np.ndarray:
+    """
+    Rule table counts as in count_transitions, summed over all realizations
+    of ens and all steps from t_trans to t_max. The combined indices of chunk
+    steps are collected in a buffer and counted by a single bincount.
+    """
+    assert ens.t <= t_trans <= t_max
+    while ens.t < t_trans:
+        ens.step()
+    counts = np.zeros(27, dtype=np.int64)
+    buffer = np.empty((chunk,) + ens.grids.shape, dtype=np.uint8)
+    filled = 0
+    while ens.t < t_max:
+        with timer or nullcontext():
+            np.multiply(ens.grids, 9, out=buffer[filled])
+            buffer[filled] += ens.life_neighborhood_grids
+            filled += 1
+            if filled == chunk or ens.t + 1 == t_max:
+                counts += np.bincount(buffer[:filled].ravel(), minlength=27)
+                filled = 0
+        ens.step()
+    return counts.reshape(3, 9)
+
+
 def count_transitions_run_avg(alpha, grid_size, q, t_max, t_trans, runs,
-                              progress_updates=True):
-    data = np.zeros((3, 9))
-    for i in range(runs):
-        if progress_updates:
-            sys.stdout.write(f"\r{round(i/runs * 100, 1)}%")
-            sys.stdout.flush()
-        sl = SporeLife(random_init_grid(grid_size, q), alpha=alpha)
-        data += count_transitions_time_avg(sl, t_max, t_trans)
-    return data / runs
+                              progress_updates=True, seed=None):
+    """
+    Rule table counts averaged over time and runs, all runs are stepped at
+    once as a SporeLifeEnsemble. The runs are seeded from seed as in a sweep,
+    see util.run_seeds.
+    """
+    grid_seeds, step_seeds = zip(*[run_seeds(seed, alpha, i)
+                                   for i in range(runs)])
+    init_grids = np.array([random_init_grid(grid_size, q, grid_seed)
+                           for grid_seed in grid_seeds])
+    ens = SporeLifeEnsemble(init_grids, alpha=alpha, seeds=step_seeds,
+                            sampling="sparse")
+    timer = Timer() if progress_updates else None
+    data = count_transitions_ensemble(ens, t_max, t_trans, timer=timer)
+    if progress_updates:
+        print(f"\rcounting took {timer.total:.2f}s of the run")
+    return data / ((t_max - t_trans) * runs)
+
+
+def _unit(alpha, runs, seeds, checkpoint, profiler=None):
+    """
+    Rule table counts summed over time and the runs of the chunk.
+    """
+    grid_seeds, step_seeds = zip(*seeds)
+    init_grids = np.array([random_init_grid(grid_size, q, grid_seed)
+                           for grid_seed in grid_seeds])
+    ens = SporeLifeEnsemble(init_grids, alpha=alpha, seeds=step_seeds,
+                            sampling="sparse")
+    ens.profiler = profiler
+    timer = profiler.phase("observables") if profiler is not None else None
+    return count_transitions_ensemble(ens, t_max, t_trans,
+                                      timer=timer)[np.newaxis]
 
 
-def _f(alpha):
-    print(f"\nalpha = {alpha}")
+def _save(alpha, counts):
     header = f"transitions.py -- Counts for different transitions in transition table, rows are DEAD, ALIVE, SPORE, cols are number of ALIVE neighbors, data averaged over time and runs -- alpha = {alpha}, (grid_size, q, t_max, t_trans, runs) = {str(PARAMS)}"
-    data = count_transitions_run_avg(alpha, *PARAMS)
-    save_data(data, param=alpha, header=header, base_path=BASE_PATH, prefix="alpha-")
+    data = counts.sum(axis=0) / ((t_max - t_trans) * runs)
+    save_results(data, param=alpha, header=header, base_path=BASE_PATH,
+                 prefix="alpha-", metadata={"alpha": alpha, **METADATA},
+                 overwrite="overwrite")
 
 
 if __name__ == "__main__":
-    save_data(ALPHAS, prefix="alpha-range", header="transitions.py -- Counts for different transitions in transition table -- Alpha values for which data is stored",
-              base_path=BASE_PATH)
-    with multiprocessing.Pool(processes=6) as pool:
-        # Use imap_unordered to apply the function to each value of alpha in 
-        # parallel and yield the results as they are ready, regardless of the
-        # order 
-        for _ in pool.imap_unordered(_f, ALPHAS):
-            pass
+    save_results(ALPHAS, prefix="alpha-range", header="transitions.py -- Counts for different transitions in transition table -- Alpha values for which data is stored",
+                 base_path=BASE_PATH, metadata=METADATA, overwrite="overwrite")
+    # Finished chunks of runs are kept when the sweep is restarted
+    sweep = Sweep(BASE_PATH, ALPHAS, runs, chunk_size=10)
+    sweep.run(_unit, merge=lambda alpha: _save(alpha, sweep.results(alpha)),
+              profile=PROFILE)
+    if PROFILE:
+        sweep.print_profiles()
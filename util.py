@@ -1,32 +1,333 @@
 import os
+import json
+import struct
+import threading
+from contextlib import contextmanager
+from time import perf_counter
 import numpy as np
 
 
+class Timer():
+    """
+    Accumulates the wall time spent in the with blocks it is used for:
+        timer = Timer()
+        with timer:
+            ...
+        timer.total, timer.calls
+    """
+    def __init__(self):
+        self.total = 0.
+        self.calls = 0
+
+    def __enter__(self):
+        self._t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.total += perf_counter() - self._t0
+        self.calls += 1
+
+
+class Profiler():
+    """
+    Accumulates wall time and calls per named phase of a computation, with a
+    Timer for every phase:
+        profiler = Profiler()
+        with profiler.phase("neighbors"):
+            ...
+        profiler.timers["neighbors"].total
+    Profilers are picklable and can be merged, e.g. to sum up the profiles of
+    the workers of a multiprocessing.Pool, and stored as JSON, see to_dict.
+    """
+    def __init__(self):
+        self.timers = {}
+
+    def phase(self, name: str) -> Timer:
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = Timer()
+        return timer
+
+    def merge(self, other: "Profiler") -> "Profiler":
+        """
+        Add the times and calls of other to this profiler and return it.
+        """
+        for name, timer in other.timers.items():
+            own = self.phase(name)
+            own.total += timer.total
+            own.calls += timer.calls
+        return self
+
+    def to_dict(self) -> dict:
+        return {name: {"total": timer.total, "calls": timer.calls}
+                for name, timer in self.timers.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Profiler":
+        profiler = cls()
+        for name, values in data.items():
+            timer = profiler.phase(name)
+            timer.total, timer.calls = values["total"], values["calls"]
+        return profiler
+
+    def report(self, title: str = None) -> str:
+        """
+        Table of the phases by decreasing total time, with the time per call
+        and the share of the time of all phases.
+        """
+        total = sum(timer.total for timer in self.timers.values())
+        lines = [title] if title is not None else []
+        lines.append(f"{'phase':<12} {'total [s]':>10} {'calls':>10} "
+                     f"{'per call [us]':>14} {'share':>7}")
+        for name, timer in sorted(self.timers.items(),
+                                  key=lambda item: -item[1].total):
+            per_call = timer.total / timer.calls * 1e6 if timer.calls else 0
+            share = timer.total / total if total else 0
+            lines.append(f"{name:<12} {timer.total:>10.3f} {timer.calls:>10} "
+                         f"{per_call:>14.1f} {share:>7.1%}")
+        return "\n".join(lines)
+
+
+class NpyWriter():
+    """
+    Streams an array to a .npy file block by block, growing along the first
+    axis, or along the last axis if fortran_order is true, so that only one
+    block has to be kept in memory. shape is the shape of the array without
+    the growing axis. The header is written with a fixed width and rewritten
+    on every flush, so the file is a valid .npy file holding everything
+    appended so far, which can be memory-mapped with
+        np.load(path, mmap_mode="r")
+    """
+    header_size = 256 # bytes, including magic string and header length
+
+    def __init__(self, path: str, shape: tuple[int], dtype,
+                 fortran_order: bool = False):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.fortran_order = fortran_order
+        self.length = 0 # along the growing axis
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        if self.fortran_order:
+            shape = self.shape + (self.length,)
+        else:
+            shape = (self.length,) + self.shape
+        header = repr({
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": self.fortran_order,
+            "shape": shape,
+        })
+        magic = np.lib.format.magic(1, 0)
+        n_pad = self.header_size - len(magic) - 2 - len(header)
+        assert n_pad >= 1
+        header = (header + " " * (n_pad - 1) + "\n").encode("latin1")
+        self.file.seek(0)
+        self.file.write(magic + struct.pack("<H", len(header)) + header)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, block: np.ndarray):
+        """
+        Append block, with the shape of the array except for the growing axis.
+        """
+        block = np.asarray(block, dtype=self.dtype)
+        if self.fortran_order:
+            assert block.shape[:-1] == self.shape
+            self.file.write(block.tobytes(order="F"))
+            self.length += block.shape[-1]
+        else:
+            assert block.shape[1:] == self.shape
+            self.file.write(block.tobytes(order="C"))
+            self.length += block.shape[0]
+
+    def flush(self):
+        self._write_header()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def run_seeds(seed, alpha: float, run: int) -> tuple:
+    """
+    Independent seed sequences (grid_seed, step_seed) for the initial grid and
+    for the steps of run run at parameter value alpha of a sweep with the root
+    seed seed. They only depend on seed, alpha (to three decimals, as in the
+    file names) and run, not on the process computing the run or the order of
+    the runs, so that any run can be recomputed on its own.
+    """
+    root = np.random.SeedSequence(seed, spawn_key=(round(alpha * 1000), run))
+    grid_seed, step_seed = root.spawn(2)
+    return grid_seed, step_seed
+
+
 def random_init_grid(grid_size: int, 
                      q: float = 0.3701, seed=None) -> np.ndarray:
-    if seed:
+    if seed is not None:
         rng = np.random.default_rng(seed)
     else:
         rng = np.random.default_rng()
     assert 0 <= q <= 1
-    return rng.choice([0, 1], p=[1-q, q], size=[grid_size, grid_size])
+    states = np.array([0, 1], dtype=np.uint8)
+    return rng.choice(states, p=[1-q, q], size=[grid_size, grid_size])
 
 
 def random_patch(grid_size: int, patch_size: int, patch_top_left: tuple[int],
                  q: float = 0.3701, seed=None) -> np.ndarray:
-    if seed:
+    if seed is not None:
         rng = np.random.default_rng(seed)
     else:
         rng = np.random.default_rng()
     assert 0 <= q <= 1
-    grid = np.zeros((grid_size, grid_size))
-    patch = rng.choice([0, 1], p=[1-q, q], size=[patch_size, patch_size])
+    grid = np.zeros((grid_size, grid_size), dtype=np.uint8)
+    states = np.array([0, 1], dtype=np.uint8)
+    patch = rng.choice(states, p=[1-q, q], size=[patch_size, patch_size])
     i, j = patch_top_left
     assert i + patch_size <= grid_size and j + patch_size <= grid_size
     grid[i:i+patch_size, j:j+patch_size] = patch
     return grid
 
 
+# What to do when saving to a path that already exists: raise a
+# FileExistsError, skip saving, overwrite the file or save to the next free
+# versioned path name-v2, name-v3, ...
+OVERWRITE_POLICIES = ("error", "skip", "overwrite", "version")
+
+
+def results_path(param=None, base_path=None, prefix=None, sub_path=None,
+                 ext=".npz") -> str:
+    """
+    Path of the file for the parameter value param, named prefix + param + ext
+    in base_path / sub_path, as used by save_data and save_results.
+    """
+    if param is None and prefix is None:
+        raise ValueError("provide file name clues")
+    if base_path is None:
+        base_path = os.getcwd() # use the current working directory
+    # format the parameter value as a valid file name
+    param = "" if param is None else "%.3f"%param
+    file_name = (prefix or "") + param + ext
+    if sub_path is not None:
+        return os.path.join(base_path, sub_path, file_name)
+    return os.path.join(base_path, file_name)
+
+
+def _apply_overwrite_policy(path: str, overwrite: str):
+    """
+    Path to save to according to the overwrite policy, or None to skip saving.
+    """
+    assert overwrite in OVERWRITE_POLICIES
+    if not os.path.exists(path) or overwrite == "overwrite":
+        return path
+    if overwrite == "error":
+        raise FileExistsError(f"{path} already exists")
+    if overwrite == "skip":
+        return None
+    stem, ext = os.path.splitext(path)
+    version = 2
+    while os.path.exists(f"{stem}-v{version}{ext}"):
+        version += 1
+    return f"{stem}-v{version}{ext}"
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"{type(obj)} is not JSON serializable")
+
+
+@contextmanager
+def atomic_write(path: str):
+    """
+    Binary file to write the contents of path to, which is written to a
+    temporary file first and renamed to path when the with block completes,
+    so that path is never left half written:
+        with atomic_write(path) as f:
+            ...
+    The temporary file is created with the permissions of any new file, i.e.
+    those allowed by the umask. Its name is unique to the process and thread,
+    so that concurrent writers do not share it.
+    """
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+                 | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def save_results(data: np.ndarray, param=None, header: str = "",
+                 base_path: str = None, prefix: str = None,
+                 sub_path: str = None, metadata: dict = None,
+                 overwrite: str = "error") -> str:
+    """
+    Save the array data compressed to a .npz file named like save_data does,
+    together with the header and the metadata dict (the parameters of the
+    run) stored as JSON, see load_results. The file is written atomically,
+    see atomic_write, so that it is never left half written.
+    If the file exists, the overwrite policy in OVERWRITE_POLICIES applies.
+    Returns the path saved to, or None if skipped.
+    """
+    path = _apply_overwrite_policy(
+        results_path(param, base_path, prefix, sub_path), overwrite)
+    if path is None:
+        return None
+    metadata = {"header": header, "param": param, **(metadata or {})}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as f:
+        np.savez_compressed(
+            f, data=np.asarray(data),
+            metadata=np.array(json.dumps(metadata, default=_json_default)))
+    return path
+
+
+def load_results(path: str, with_metadata: bool = False):
+    """
+    Load the data array saved by save_results, and its metadata dict if
+    with_metadata is true. Text files written by save_data are read with
+    np.loadtxt, with the header as metadata, if path or its .dat counterpart
+    is such a file. .npy files, e.g. written by NpyWriter, are memory-mapped
+    read-only and have no metadata.
+    """
+    stem, ext = os.path.splitext(path)
+    if ext != ".dat" and not os.path.exists(path):
+        if os.path.exists(stem + ".dat"):
+            path, ext = stem + ".dat", ".dat"
+    if ext == ".dat":
+        data = np.loadtxt(path)
+        with open(path) as f:
+            line = f.readline()
+        header = line[2:].rstrip("\n") if line.startswith("# ") else ""
+        metadata = {"header": header}
+    elif ext == ".npy":
+        data = np.load(path, mmap_mode="r")
+        metadata = {}
+    else:
+        with np.load(path) as npz:
+            data = npz["data"]
+            metadata = json.loads(npz["metadata"].item())
+    if with_metadata:
+        return data, metadata
+    return data
+
+
 def save_data(data, param=None, header="", base_path=None, prefix=None,
               sub_path=None, overwrite_protection=True):
     # data: one or more numpy arrays
@@ -35,6 +336,7 @@ def save_data(data, param=None, header="", base_path=None, prefix=None,
     # base_path: an optional string indicating the base directory where the file will be stored
     # prefix: an optional string to be used as the file name prefix
     # sub_path: an optional string indicating a subdirectory within the base path
+    # overwrite_protection: raise a FileExistsError instead of overwriting an existing file
 
     # check if data is a single array or a sequence of arrays
     if not isinstance(data, np.ndarray):
@@ -51,9 +353,7 @@ def save_data(data, param=None, header="", base_path=None, prefix=None,
         raise TypeError("header must be a string")
 
     # check if the base path is None, a valid directory, or an invalid value
-    if base_path is None:
-        base_path = os.getcwd() # use the current working directory
-    elif not isinstance(base_path, str):
+    if base_path is not None and not isinstance(base_path, str):
         raise TypeError("base path must be a string or None")
 
     # check if the prefix is a string
@@ -63,36 +363,13 @@ def save_data(data, param=None, header="", base_path=None, prefix=None,
     # check if the sub path is a string or None
     if sub_path is not None and not isinstance(sub_path, str):
         raise TypeError("sub path must be a string or None")
-    
-    if param is None and prefix is None:
-        raise ValueError("provide file name clues")
 
-    # format the parameter value as a valid file name
-    if param is not None:
-        param = "%.3f"%param # keep four decimal places and strip trailing zeros and dot
-    else:
-        param = ""
-    
-    if prefix is None:
-        prefix = ""
-
-    # construct the full path by joining the base path, sub path, and file name
-    file_name = prefix + param + ".dat" # use the parameter value to name the file
-    if sub_path is not None:
-        full_path = os.path.join(base_path, sub_path, file_name) # append the sub path if given
-    else:
-        full_path = os.path.join(base_path, file_name) # otherwise, use only the base path
-    
-    if os.path.exists(full_path):
-        answer = input(f"The file {file_name} already exists. Do you want to overwrite it? (Y/N) ")
-        if answer.upper() != "Y":
-            print("Aborting the program.")
-            exit()
+    full_path = _apply_overwrite_policy(
+        results_path(param, base_path, prefix, sub_path, ext=".dat"),
+        "error" if overwrite_protection else "overwrite")
 
     # create the base path and the sub path if they do not exist
     os.makedirs(os.path.dirname(full_path), exist_ok=True) # create the directory recursively and ignore the FileExistsError
 
     # save the data to the file using np.savetxt
     np.savetxt(full_path, data, header=header) # stack the arrays horizontally and write the header
-
-